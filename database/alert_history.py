@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Append-only columnar alert history for regional analytics
+
+Alerts are appended to Parquet files partitioned by onset month
+(<root>/year=YYYY/month=M/part-*.parquet), with the home's ZIP code and state
+denormalised onto each row. Time-bucketed aggregates by severity, type and
+region are answered from these files with pyarrow, reading only the
+partitions and columns a query needs and never touching the production
+database. The store is filled from the Alerts table past a saved high-water
+mark, so it can always catch up after a crash or an outage.
+
+Examples:
+    python alert_history.py sync
+    python alert_history.py sync --db mydatabase.db
+    python alert_history.py counts --by severity,zip --severity Severe,Extreme --zip 60657
+"""
+
+import argparse
+import atexit
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: syncs are only serialised within one process
+    fcntl = None
+
+DEFAULT_ROOT = Path("alert_history")
+DEFAULT_FLUSH_ROWS = 10000
+DEFAULT_FLUSH_SECONDS = 60.0
+SYNC_CHUNK_SIZE = 50000
+# Re-scanned before a shard's newest synced created_at, for clock skew between writers
+SYNC_WINDOW = "-1 day"
+
+# "..., CHICAGO, IL 60657" / "..., Chicago, IL 60657-2904"
+REGION_PATTERN = r"(?P<state>[A-Za-z]{2})\s+(?P<zip>\d{5})(?:-\d{4})?\s*$"
+
+BUCKETS = ("year", "month", "week", "day")
+GROUP_COLUMNS = ("severity", "type", "source", "zip", "state")
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("The alert history store requires pyarrow: pip3 install pyarrow")
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([("year", pa.int16()), ("month", pa.int8())]), flavor="hive")
+
+# ---------- Writing ----------
+class AlertHistoryWriter:
+    """
+    Keeps the history store in step with the Alerts table. Synced alert ids
+    are recorded in a ledger (<root>/_state/ledger.db) only after their rows
+    are on disk, so a crash or a missing pyarrow never loses history and an
+    alert is never written twice: the next sync picks up every Alerts row
+    whose id is not in the ledger. Row ids are not used, as SQLite reuses
+    them after deletes and rebalancing renumbers moved rows.
+
+    To keep syncs cheap, only rows created at most SYNC_WINDOW before the
+    newest row already synced from a shard are scanned. Rows that arrive
+    with older created_at values (e.g. moved in by a rebalance before they
+    were synced) need `python alert_history.py sync --full`.
+
+    insert_alert only reports that a shard has new rows; a sync runs once
+    flush_rows alerts are pending or flush_seconds after the first of them,
+    whichever comes first, and at exit. Those syncs are best-effort and never
+    fail the insert; `python alert_history.py sync` catches up explicitly.
+    """
+
+    def __init__(self, root: Path = DEFAULT_ROOT, flush_rows: int = DEFAULT_FLUSH_ROWS,
+                 flush_seconds: float = DEFAULT_FLUSH_SECONDS):
+        self.root = Path(root)
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[Optional[int], int] = {}
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._warned = False
+
+    # ---------- Ingestion hooks ----------
+    def note_insert(self, shard: Optional[int] = None):
+        """Record one new Alerts row in shard (None when unsharded)"""
+        with self._lock:
+            self._pending[shard] = self._pending.get(shard, 0) + 1
+            due = sum(self._pending.values()) >= self.flush_rows
+            if not due and self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Best-effort sync of every shard with pending alerts"""
+        with self._lock:
+            shards, self._pending = list(self._pending), {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        for shard in shards:
+            try:
+                self.sync_shard(shard)
+            except ImportError as e:
+                if not self._warned:
+                    self._warned = True
+                    print(f"⚠️ Alert history not updated ({e}); run `python alert_history.py sync` later",
+                          file=sys.stderr)
+            except Exception as e:
+                print(f"⚠️ Alert history sync failed for {_shard_tag(shard)}: {e}", file=sys.stderr)
+
+    # ---------- Catch-up ----------
+    def sync_shard(self, shard: Optional[int] = None, chunk_size: int = SYNC_CHUNK_SIZE, full: bool = False) -> int:
+        """Append the shard's Alerts rows missing from the store; returns rows written"""
+        from db_props import get_connection
+
+        conn = get_connection(shard=shard)
+        try:
+            return self.sync(conn, _shard_tag(shard), chunk_size, full)
+        finally:
+            conn.close()
+
+    def sync(self, conn: sqlite3.Connection, tag: str, chunk_size: int = SYNC_CHUNK_SIZE, full: bool = False) -> int:
+        """
+        Append Alerts rows from conn whose ids are not in the ledger, scanning
+        every row when full is set. Each chunk's files are named after its
+        first alert id, so a chunk re-read after a crash replaces its earlier
+        files instead of adding duplicates.
+        """
+        _require_pyarrow()
+        total = 0
+        with self._sync_lock, self._state_lock():
+            ledger = self._open_ledger()
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON Alerts(created_at)")
+            conn.commit()
+            conn.execute("ATTACH DATABASE ? AS ledger", (self._ledger_path().as_posix(),))
+            try:
+                mark = None
+                if not full:
+                    row = ledger.execute("SELECT created_at FROM SyncMarks WHERE shard = ?", (tag,)).fetchone()
+                    mark = row[0] if row else None
+                window = "a.created_at >= datetime(?, ?) AND" if mark else ""
+                window_params = (mark, SYNC_WINDOW) if mark else ()
+                while True:
+                    chunk = pd.read_sql_query(f"""
+                        SELECT a.id AS alert_id, a.home_id, a.source, a.type, a.severity,
+                               a.onset, a.expires_at, h.address_text, a.created_at AS alert_created_at
+                        FROM Alerts a LEFT JOIN Homes h ON h.id = a.home_id
+                        WHERE {window} NOT EXISTS (SELECT 1 FROM ledger.SyncedAlerts s WHERE s.alert_id = a.id)
+                        ORDER BY a.created_at, a.id
+                        LIMIT ?
+                    """, conn, params=(*window_params, chunk_size))
+                    if chunk.empty:
+                        return total
+                    first = hashlib.sha1(str(chunk["alert_id"].iloc[0]).encode("utf-8")).hexdigest()[:16]
+                    self.write_frame(chunk.drop(columns=["alert_created_at"]), name=f"part-{tag}-{first}.parquet")
+                    created = chunk["alert_created_at"].dropna().astype(str)
+                    ledger.executemany(
+                        "INSERT OR IGNORE INTO SyncedAlerts (alert_id) VALUES (?)",
+                        ((a,) for a in chunk["alert_id"]),
+                    )
+                    if not created.empty:
+                        ledger.execute("""
+                            INSERT INTO SyncMarks (shard, created_at) VALUES (?, ?)
+                            ON CONFLICT(shard) DO UPDATE SET created_at = max(created_at, excluded.created_at)
+                        """, (tag, created.max()))
+                    ledger.commit()
+                    total += len(chunk)
+            finally:
+                conn.execute("DETACH DATABASE ledger")
+                ledger.close()
+
+    def synced_count(self) -> int:
+        """Number of alert ids recorded in the ledger"""
+        if not self._ledger_path().exists():
+            return 0
+        ledger = sqlite3.connect(self._ledger_path().as_posix())
+        try:
+            return ledger.execute("SELECT COUNT(*) FROM SyncedAlerts").fetchone()[0]
+        except sqlite3.OperationalError:
+            return 0
+        finally:
+            ledger.close()
+
+    def _ledger_path(self) -> Path:
+        return self.root / "_state" / "ledger.db"
+
+    def _open_ledger(self) -> sqlite3.Connection:
+        ledger = sqlite3.connect(self._ledger_path().as_posix())
+        ledger.executescript("""
+        CREATE TABLE IF NOT EXISTS SyncedAlerts (alert_id TEXT PRIMARY KEY) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS SyncMarks (shard TEXT PRIMARY KEY, created_at TEXT);
+        """)
+        if ledger.execute("SELECT 1 FROM SyncedAlerts LIMIT 1").fetchone() is None:
+            # A store written before the ledger existed: record what it already holds
+            ledger.executemany("INSERT OR IGNORE INTO SyncedAlerts (alert_id) VALUES (?)",
+                               ((a,) for a in self._stored_alert_ids()))
+            ledger.commit()
+        return ledger
+
+    def _stored_alert_ids(self) -> Iterator[str]:
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(self.root.as_posix(), format="parquet", partitioning=_partitioning())
+        if not dataset.files:
+            return
+        for batch in dataset.to_batches(columns=["alert_id"]):
+            yield from batch.column(0).to_pylist()
+
+    @contextmanager
+    def _state_lock(self):
+        """Serialises syncs of this store across processes"""
+        state_dir = self.root / "_state"
+        state_dir.mkdir(parents=True, exist_ok=True)
+        with (state_dir / "sync.lock").open("a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+    # ---------- Files ----------
+    def write_frame(self, df: pd.DataFrame, name: Optional[str] = None) -> int:
+        """
+        Write a frame of alert rows (alert_id, home_id, source, type, severity,
+        onset, expires_at, address_text). ZIP/state are parsed from
+        address_text and rows are split by onset month; each month gets one
+        file, called name if given. Returns the number of rows written.
+        """
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if df.empty:
+            return 0
+        df = df.copy()
+        # Homes repeat across alerts, so parse each distinct address once
+        addresses = df["address_text"].astype("category")
+        region = addresses.cat.categories.to_series().str.extract(REGION_PATTERN)
+        df["zip"] = addresses.map(region["zip"]).astype("string")
+        df["state"] = addresses.map(region["state"].str.upper()).astype("string")
+        df["onset"] = pd.to_datetime(df["onset"], utc=True, format="ISO8601", errors="coerce")
+        df["expires_at"] = pd.to_datetime(df["expires_at"], utc=True, format="ISO8601", errors="coerce")
+        df = df.dropna(subset=["onset"]).drop(columns=["address_text"])
+        for col in ("source", "type", "severity"):
+            df[col] = df[col].astype("category")
+
+        written = 0
+        for (year, month), part in df.groupby([df["onset"].dt.year, df["onset"].dt.month]):
+            part_dir = self.root / f"year={int(year)}" / f"month={int(month)}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            file_name = name or _new_part_name()
+            # Written under a "_" name first: dataset discovery skips it until the rename
+            tmp_path = part_dir / f"_{file_name}"
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path.as_posix())
+            os.replace(tmp_path, part_dir / file_name)
+            written += len(part)
+        return written
+
+    def compact(self, year: int, month: int) -> int:
+        """
+        Merge a month's part files into one; returns the number of files replaced.
+        Queries running while the old parts are removed may briefly double count.
+        Run it outside syncs: a chunk re-read after a crash would no longer
+        replace its merged rows.
+        """
+        _require_pyarrow()
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        part_dir = self.root / f"year={year}" / f"month={month}"
+        parts = sorted(part_dir.glob("part-*.parquet"))
+        if len(parts) < 2:
+            return 0
+        tables = [pq.ParquetFile(p.as_posix()).read() for p in parts]
+        merged = pa.concat_tables(tables, promote_options="permissive")
+        name = _new_part_name()
+        tmp_path = part_dir / f"_{name}"
+        pq.write_table(merged, tmp_path.as_posix())
+        os.replace(tmp_path, part_dir / name)
+        for p in parts:
+            p.unlink()
+        return len(parts)
+
+def _shard_tag(shard: Optional[int]) -> str:
+    return "main" if shard is None else f"shard{shard}"
+
+def _new_part_name() -> str:
+    return f"part-{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+
+# Shared writer used by db_props.insert_alert; pending shards are synced at exit.
+alert_history = AlertHistoryWriter()
+atexit.register(alert_history.flush)
+
+
+# ---------- Queries ----------
+def _month_filter(ds, start: Optional[datetime], end: Optional[datetime]):
+    """Partition-pruning expression on year/month for [start, end)"""
+    expr = None
+    if start is not None:
+        after = (ds.field("year") > start.year) | ((ds.field("year") == start.year) & (ds.field("month") >= start.month))
+        expr = after
+    if end is not None:
+        before = (ds.field("year") < end.year) | ((ds.field("year") == end.year) & (ds.field("month") <= end.month))
+        expr = before if expr is None else expr & before
+    return expr
+
+def alert_counts(root: Path = DEFAULT_ROOT,
+                 bucket: str = "month",
+                 by: Sequence[str] = ("severity",),
+                 start: Optional[str] = None,
+                 end: Optional[str] = None,
+                 severity: Optional[Sequence[str]] = None,
+                 types: Optional[Sequence[str]] = None,
+                 zips: Optional[Sequence[str]] = None,
+                 states: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Count alerts per time bucket (year, month, week or day of onset) and the
+    `by` columns, optionally restricted to an onset range [start, end) and
+    to given severities, types, ZIP codes or states.
+    """
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket {bucket}; choose from {', '.join(BUCKETS)}")
+    unknown = [c for c in by if c not in GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_COLUMNS)}")
+
+    root = Path(root)
+    if not root.exists():
+        return pd.DataFrame(columns=[bucket, *by, "alerts"])
+    dataset = ds.dataset(root.as_posix(), format="parquet", partitioning=_partitioning())
+    if not dataset.files:
+        return pd.DataFrame(columns=[bucket, *by, "alerts"])
+
+    start_ts = pd.Timestamp(start, tz="UTC") if start else None
+    end_ts = pd.Timestamp(end, tz="UTC") if end else None
+    expr = _month_filter(ds, start_ts, end_ts)
+
+    def add(condition):
+        nonlocal expr
+        expr = condition if expr is None else expr & condition
+
+    onset_type = dataset.schema.field("onset").type
+    if start_ts is not None:
+        add(ds.field("onset") >= pa.scalar(start_ts.to_pydatetime(), type=onset_type))
+    if end_ts is not None:
+        add(ds.field("onset") < pa.scalar(end_ts.to_pydatetime(), type=onset_type))
+    if severity:
+        add(ds.field("severity").isin(list(severity)))
+    if types:
+        add(ds.field("type").isin(list(types)))
+    if zips:
+        add(ds.field("zip").isin(list(zips)))
+    if states:
+        add(ds.field("state").isin([s.upper() for s in states]))
+
+    columns = sorted(set(by) | {"year", "month"} | ({"onset"} if bucket in ("week", "day") else set()))
+    table = dataset.to_table(columns=columns, filter=expr)
+
+    if bucket == "year":
+        keys = ["year"]
+    elif bucket == "month":
+        keys = ["year", "month"]
+    else:
+        floored = pc.floor_temporal(table["onset"], unit=bucket)
+        table = table.append_column(bucket, floored)
+        keys = [bucket]
+
+    # Dictionary-encoded columns group as their plain values
+    for col in by:
+        if pa.types.is_dictionary(table[col].type):
+            idx = table.column_names.index(col)
+            table = table.set_column(idx, col, table[col].cast(pa.string()))
+
+    grouped = table.group_by(keys + list(by)).aggregate([([], "count_all")])
+    df = grouped.to_pandas().rename(columns={"count_all": "alerts"})
+    if bucket == "month":
+        df.insert(0, "month", pd.to_datetime({"year": df.pop("year"), "month": df.pop("month"), "day": 1}).dt.strftime("%Y-%m"))
+    return df.sort_values([bucket, *by], ignore_index=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar alert history for regional analytics")
+    parser.add_argument("--root", default=str(DEFAULT_ROOT), help="History store directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sy = sub.add_parser("sync", help="Append Alerts rows not yet in the history store")
+    sy.add_argument("--db", help="SQLite database, tracked as the unsharded one (default: db_props, every shard)")
+    sy.add_argument("--full", action="store_true", help="Scan every Alerts row, not just recent ones")
+
+    q = sub.add_parser("counts", help="Time-bucketed alert counts")
+    q.add_argument("--bucket", default="month", choices=BUCKETS)
+    q.add_argument("--by", default="severity", help=f"Comma-separated: {', '.join(GROUP_COLUMNS)}")
+    q.add_argument("--start", help="Inclusive onset lower bound, e.g. 2023-01-01")
+    q.add_argument("--end", help="Exclusive onset upper bound")
+    q.add_argument("--severity", help="Comma-separated severities")
+    q.add_argument("--type", dest="types", help="Comma-separated alert types")
+    q.add_argument("--zip", dest="zips", help="Comma-separated ZIP codes")
+    q.add_argument("--state", dest="states", help="Comma-separated state codes")
+    args = parser.parse_args()
+
+    split = lambda v: [x.strip() for x in v.split(",")] if v else None
+    writer = AlertHistoryWriter(Path(args.root))
+
+    if args.command == "sync":
+        if args.db:
+            conn = sqlite3.connect(args.db)
+            try:
+                total = writer.sync(conn, _shard_tag(None), full=args.full)
+            finally:
+                conn.close()
+        else:
+            from db_props import shard_indexes
+            total = sum(writer.sync_shard(shard, full=args.full) for shard in shard_indexes())
+        print(f"✅ Synced {total} alerts into {args.root}")
+    else:
+        df = alert_counts(
+            Path(args.root), bucket=args.bucket, by=split(args.by) or [],
+            start=args.start, end=args.end,
+            severity=split(args.severity), types=split(args.types),
+            zips=split(args.zips), states=split(args.states),
+        )
+        print(df.to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -3,33 +3,98 @@
 Simple database utility for HouseKeep
 """
 
+import re
 import sqlite3
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional
+
+from sharding import ShardRouter
+
+# Clauses whose result is wrong when each shard's rows are simply concatenated
+_NEEDS_MERGE = re.compile(
+    r"\b(GROUP\s+BY|ORDER\s+BY|LIMIT|OFFSET|DISTINCT|HAVING|UNION|INTERSECT|EXCEPT|"
+    r"COUNT|SUM|TOTAL|AVG|MIN|MAX|GROUP_CONCAT)\b",
+    re.IGNORECASE,
+)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+def needs_merge(query: str) -> bool:
+    """True if a fanned-out query aggregates, sorts, de-duplicates or limits its rows"""
+    return bool(_NEEDS_MERGE.search(_STRING_LITERAL.sub("''", query)))
 
 class HouseKeepDB:
     """Simple database connection class for HouseKeep"""
-    
-    def __init__(self, db_path: str = "housekeep.db"):
+
+    def __init__(self, db_path: str = "housekeep.db", shard_paths: Optional[List[str]] = None):
         self.db_path = db_path
         self.conn = None
-    
-    def connect(self):
-        """Connect to the database"""
+        self.shard_conns: List[sqlite3.Connection] = []
+        # With shard_paths, queries are routed by user_id instead of going to db_path
+        self.router = ShardRouter(shard_paths) if shard_paths else None
+
+    def connect(self, user_id: Optional[str] = None):
+        """Connect to the database (the shard owning user_id when sharded)"""
+        if self.router:
+            if user_id is None:
+                raise ValueError("Database is sharded: pass user_id to connect")
+            self.disconnect()
+            self.conn = self.router.connect_for_user(user_id, row_factory=sqlite3.Row)
+            return self.conn
         self.conn = sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row  # Enable column access by name
         return self.conn
-    
+
+    def connect_all(self) -> List[sqlite3.Connection]:
+        """
+        One connection per shard (just the database when unsharded), for
+        whole-database jobs. Like connect(), values come back as SQLite
+        stores them: DATE/DATETIME columns are not parsed.
+        """
+        if not self.router:
+            return [self.connect()]
+        self.disconnect()
+        for path in self.router.paths:
+            conn = sqlite3.connect(path.as_posix())
+            conn.row_factory = sqlite3.Row
+            self.shard_conns.append(conn)
+        return self.shard_conns
+
     def disconnect(self):
         """Disconnect from the database"""
         if self.conn:
             self.conn.close()
             self.conn = None
-    
-    def execute_query(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
-        """Execute a SELECT query and return results as list of dictionaries"""
+        for conn in self.shard_conns:
+            conn.close()
+        self.shard_conns = []
+
+    def execute_query(self, query: str, params: tuple = (), user_id: Optional[str] = None,
+                      merge: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+        """
+        Execute a SELECT query and return results as list of dictionaries.
+
+        When sharded, user_id routes the query to one shard; without it the
+        query is fanned out to every shard and the rows are concatenated.
+        Concatenation is only correct for plain scans: COUNT/SUM/... give one
+        partial row per shard, ORDER BY is only sorted within a shard, and
+        LIMIT returns up to one limit per shard. Such queries raise
+        ValueError unless merge is given, which receives the concatenated
+        rows and returns the combined result, e.g.
+        merge=lambda rows: [{"n": sum(r["n"] for r in rows)}].
+        """
+        if self.router:
+            if user_id is None:
+                if merge is None and needs_merge(query):
+                    raise ValueError(
+                        "Database is sharded: pass user_id, or merge= to combine per-shard "
+                        "results of a query that aggregates, sorts, de-duplicates or limits"
+                    )
+                rows = self.router.fan_out(query, params)
+                return merge(rows) if merge else rows
+            return self.router.query_shard(self.router.shard_index(user_id), query, params)
+
         if not self.conn:
             self.connect()
-        
+
         cursor = self.conn.cursor()
         cursor.execute(query, params)
         rows = cursor.fetchall()
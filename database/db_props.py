@@ -1,47 +1,114 @@
 # db_props.py
+import os
+import secrets
 import sqlite3
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+from alert_history import alert_history
+from profile_cache import profile_cache
+from sharding import ShardRouter
 
 DB_PATH = Path("mydatabase.db")
 SCHEMA_PATH = Path("schema.sql")
 
-def get_connection(row_factory=None):
+RAW_PROPERTIES_DDL = """
+CREATE TABLE IF NOT EXISTS RawProperties (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    home_id TEXT,
+    source TEXT,
+    raw_json TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY(home_id) REFERENCES Homes(id) ON DELETE CASCADE
+);
+"""
+
+# ---------- Sharding ----------
+# When configured, Users and their dependent rows are spread over several
+# database files by hashed user_id instead of living in DB_PATH.
+# HOUSEKEEP_SHARDS takes a comma-separated list of shard files.
+_shard_router: Optional[ShardRouter] = None
+
+def configure_shards(paths: Optional[List[str]]):
+    """Route all connections through the given shard files; pass None to go back to DB_PATH."""
+    global _shard_router
+    _shard_router = ShardRouter(paths) if paths else None
+
+def shard_router() -> Optional[ShardRouter]:
+    return _shard_router
+
+def shard_indexes() -> List[Optional[int]]:
+    """Shards to visit for a whole-database job: [None] when unsharded."""
+    if _shard_router is None:
+        return [None]
+    return list(range(_shard_router.shard_count))
+
+if os.environ.get("HOUSEKEEP_SHARDS"):
+    configure_shards(os.environ["HOUSEKEEP_SHARDS"].split(","))
+
+def get_connection(row_factory=None, user_id: Optional[str] = None, shard: Optional[int] = None):
+    """
+    Connection to DB_PATH, or when sharded to the shard owning user_id (or
+    the explicit shard index). Sharded callers must say which shard they need.
+    """
+    if _shard_router is not None:
+        if user_id is not None:
+            return _shard_router.connect_for_user(user_id, row_factory)
+        if shard is not None:
+            return _shard_router.connect(shard, row_factory)
+        raise ValueError("Database is sharded: pass user_id or shard to get_connection")
     conn = sqlite3.connect(DB_PATH.as_posix(), detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
     if row_factory:
         conn.row_factory = row_factory
     return conn
 
+def get_home_connection(home_id: str, row_factory=None):
+    """Connection to the database holding home_id (located by fan-out when sharded)."""
+    if _shard_router is None:
+        return get_connection(row_factory)
+    shard = _shard_router.locate_home(home_id)
+    if shard is None:
+        raise LookupError(f"Home {home_id} not found in any shard")
+    return _shard_router.connect(shard, row_factory)
+
+def load_schema_sql(schema_path: Path = SCHEMA_PATH) -> str:
+    """Schema script plus RawProperties, which is not part of the base schema."""
+    if not schema_path.exists():
+        raise FileNotFoundError(f"{schema_path} not found")
+    return schema_path.read_text() + RAW_PROPERTIES_DDL
+
 def init_db():
     """Run schema.sql to create tables, and ensure RawProperties exists."""
-    if not SCHEMA_PATH.exists():
-        raise FileNotFoundError(f"{SCHEMA_PATH} not found")
+    sql = load_schema_sql()
 
-    sql = SCHEMA_PATH.read_text()
+    if _shard_router is not None:
+        _shard_router.init_shards(sql)
+        return
 
     # run schema.sql
     conn = get_connection()
     try:
         conn.executescript(sql)
-        # Create RawProperties table if it wasn't in schema.sql
-        conn.executescript("""
-        CREATE TABLE IF NOT EXISTS RawProperties (
-            id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-            home_id TEXT,
-            source TEXT,
-            raw_json TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(home_id) REFERENCES Homes(id) ON DELETE CASCADE
-        );
-        """)
         conn.commit()
     finally:
         conn.close()
 
 # ---------- Users helper ----------
 def find_user_by_phone_or_name(phone_e164: Optional[str], display_name: Optional[str]) -> Optional[str]:
+    if _shard_router is not None:
+        # Phone and name are not shard keys, so every shard has to be asked
+        if phone_e164:
+            rows = _shard_router.fan_out("SELECT id FROM Users WHERE phone_e164 = ?", (phone_e164,))
+            if rows:
+                return rows[0]["id"]
+        if display_name:
+            rows = _shard_router.fan_out("SELECT id FROM Users WHERE display_name = ?", (display_name,))
+            if rows:
+                return rows[0]["id"]
+        return None
+
     conn = get_connection(row_factory=sqlite3.Row)
     try:
         cur = conn.cursor()
@@ -61,21 +128,21 @@ def find_user_by_phone_or_name(phone_e164: Optional[str], display_name: Optional
 
 def create_user(display_name: str, phone_e164: Optional[str] = None) -> str:
     """Insert a user and return user.id"""
-    conn = get_connection()
+    # Same format as the schema default; generated here so the shard is known before the insert
+    user_id = secrets.token_hex(16)
+    conn = get_connection(user_id=user_id)
     try:
         cur = conn.cursor()
-        cur.execute("INSERT INTO Users (display_name, phone_e164) VALUES (?, ?)", (display_name, phone_e164))
+        cur.execute("INSERT INTO Users (id, display_name, phone_e164) VALUES (?, ?, ?)", (user_id, display_name, phone_e164))
         conn.commit()
-        # fetch the generated id via rowid
-        rowid = cur.lastrowid
-        cur.execute("SELECT id FROM Users WHERE rowid = ?", (rowid,))
-        return cur.fetchone()[0]
+        profile_cache.invalidate_user(user_id)
+        return user_id
     finally:
         conn.close()
 
 # ---------- Homes / RawProperties helpers ----------
 def find_home_by_address_for_user(user_id: str, address_text: str) -> Optional[str]:
-    conn = get_connection(row_factory=sqlite3.Row)
+    conn = get_connection(row_factory=sqlite3.Row, user_id=user_id)
     try:
         cur = conn.cursor()
         cur.execute("SELECT id FROM Homes WHERE user_id = ? AND address_text = ?", (user_id, address_text))
@@ -93,7 +160,7 @@ def insert_home(user_id: str,
                 bedrooms: Optional[int] = None,
                 bathrooms: Optional[float] = None,
                 created_at: Optional[str] = None) -> str:
-    conn = get_connection()
+    conn = get_connection(user_id=user_id)
     try:
         cur = conn.cursor()
         cur.execute("""
@@ -129,12 +196,19 @@ def insert_home(user_id: str,
         rowid = cur.lastrowid
         cur.execute("SELECT id FROM Homes WHERE rowid = ?", (rowid,))
         home_id = cur.fetchone()[0]
+        profile_cache.remember_home_owner(home_id, user_id)
+        profile_cache.invalidate_home(home_id)
+        profile_cache.invalidate_user(user_id)
         return home_id
     finally:
         conn.close()
 
-def insert_raw_property(home_id: Optional[str], raw_json: str, source: str = "attom") -> str:
-    conn = get_connection()
+def insert_raw_property(home_id: Optional[str], raw_json: str, source: str = "attom",
+                        user_id: Optional[str] = None) -> str:
+    if user_id is not None or home_id is None:
+        conn = get_connection(user_id=user_id)
+    else:
+        conn = get_home_connection(home_id)
     try:
         cur = conn.cursor()
         cur.execute("""
@@ -143,10 +217,106 @@ def insert_raw_property(home_id: Optional[str], raw_json: str, source: str = "at
         conn.commit()
         rowid = cur.lastrowid
         cur.execute("SELECT id FROM RawProperties WHERE rowid = ?", (rowid,))
-        return cur.fetchone()[0]
+        raw_id = cur.fetchone()[0]
+        if home_id:
+            profile_cache.invalidate_home(home_id)
+        return raw_id
+    finally:
+        conn.close()
+
+# ---------- Alerts ----------
+def insert_alert(home_id: str,
+                 source: str,
+                 type: str,
+                 severity: str,
+                 headline: str,
+                 onset: str,
+                 expires_at: str,
+                 instruction: Optional[str] = None,
+                 raw_json: Optional[str] = None) -> str:
+    """
+    Insert an alert for a home and return Alerts.id. The alert history store
+    picks the row up on its next (best-effort) sync.
+    """
+    alert_id = secrets.token_hex(16)
+    conn = get_home_connection(home_id)
+    try:
+        conn.execute("""
+            INSERT INTO Alerts (id, home_id, source, type, severity, headline, instruction, onset, expires_at, raw_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (alert_id, home_id, source, type, severity, headline, instruction, onset, expires_at, raw_json))
+        conn.commit()
     finally:
         conn.close()
 
+    alert_history.note_insert(_shard_router.locate_home(home_id) if _shard_router else None)
+    profile_cache.invalidate_home(home_id)
+    return alert_id
+
+# ---------- Cached profile reads ----------
+OPEN_TASK_STATUSES = ("active", "snoozed")
+
+def _load_home_profile(conn: sqlite3.Connection, home: Dict[str, Any]) -> Dict[str, Any]:
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM Contacts WHERE home_id = ? ORDER BY is_primary DESC, name", (home["id"],))
+    contacts = [dict(r) for r in cur.fetchall()]
+    cur.execute(
+        "SELECT * FROM Tasks WHERE home_id = ? AND status IN (?, ?) ORDER BY next_due",
+        (home["id"], *OPEN_TASK_STATUSES),
+    )
+    open_tasks = [dict(r) for r in cur.fetchall()]
+    return {"home": home, "contacts": contacts, "open_tasks": open_tasks}
+
+def get_home_profile(home_id: str) -> Optional[Dict[str, Any]]:
+    """Return {home, contacts, open_tasks} for a home, served from profile_cache when fresh."""
+    def load():
+        try:
+            conn = get_home_connection(home_id, row_factory=sqlite3.Row)
+        except LookupError:
+            return None
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM Homes WHERE id = ?", (home_id,))
+            r = cur.fetchone()
+            if not r:
+                if _shard_router is not None:
+                    # Deleted since it was located; don't keep routing to its old shard
+                    _shard_router.forget_home(home_id)
+                return None
+            home = dict(r)
+            profile_cache.remember_home_owner(home_id, home["user_id"])
+            return _load_home_profile(conn, home)
+        finally:
+            conn.close()
+
+    return profile_cache.get_or_load(("home", home_id), load)
+
+def get_user_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Return {user, homes} for a user, where each home carries its contacts and
+    open tasks. Served from profile_cache when fresh.
+    """
+    def load():
+        conn = get_connection(row_factory=sqlite3.Row, user_id=user_id)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM Users WHERE id = ?", (user_id,))
+            r = cur.fetchone()
+            if not r:
+                return None
+            user = dict(r)
+            cur.execute("SELECT * FROM Homes WHERE user_id = ? ORDER BY created_at", (user_id,))
+            homes = []
+            for home_row in cur.fetchall():
+                home = dict(home_row)
+                profile_cache.remember_home_owner(home["id"], user_id)
+                homes.append(_load_home_profile(conn, home))
+            return {"user": user, "homes": homes}
+        finally:
+            conn.close()
+
+    return profile_cache.get_or_load(("user", user_id), load)
+
 # ---------- Mapping function ----------
 def normalize_date(date_str: Optional[str]) -> Optional[str]:
     if not date_str:
@@ -238,6 +408,6 @@ def import_property_json_file(user_id: str, json_path: str, store_raw: bool = Tr
         )
 
     if store_raw:
-        insert_raw_property(home_id, raw, source="attom")
+        insert_raw_property(home_id, raw, source="attom", user_id=user_id)
 
     return home_id
@@ -0,0 +1,279 @@
+# evidence_store.py
+"""
+Content-addressed blob store for task evidence files.
+
+Uploads are hashed with SHA-256 while they stream to a temp file, then moved
+to objects/<aa>/<bb>/<digest>, so identical photos are stored once. The
+value kept in Tasks.evidence_path / TaskCompletions.evidence_path is the key
+"sha256:<digest>". EvidenceBlobs tracks a reference count per key that
+triggers keep in step with inserts, updates and deletes of those rows;
+collect_garbage() removes blobs nobody references any more.
+"""
+
+import hashlib
+import mmap
+import os
+import re
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from db_props import get_connection, shard_indexes, shard_router
+
+DEFAULT_ROOT = Path("evidence")
+CHUNK_SIZE = 1024 * 1024
+# Unreferenced blobs younger than this are kept: they may have just been
+# uploaded for a row that is about to be written.
+DEFAULT_GRACE_SECONDS = 24 * 3600
+
+KEY_RE = re.compile(r"^sha256:([0-9a-f]{64})$")
+
+EVIDENCE_TABLES = ("Tasks", "TaskCompletions")
+
+def ensure_evidence_tables(conn: sqlite3.Connection):
+    """Create EvidenceBlobs and the triggers that maintain its reference counts"""
+    triggers = []
+    for table in EVIDENCE_TABLES:
+        triggers.append(f"""
+        CREATE TRIGGER IF NOT EXISTS evidence_ref_{table.lower()}_insert
+            AFTER INSERT ON {table}
+            WHEN NEW.evidence_path IS NOT NULL
+            BEGIN
+                UPDATE EvidenceBlobs SET refcount = refcount + 1 WHERE key = NEW.evidence_path;
+            END;
+        CREATE TRIGGER IF NOT EXISTS evidence_ref_{table.lower()}_delete
+            AFTER DELETE ON {table}
+            WHEN OLD.evidence_path IS NOT NULL
+            BEGIN
+                UPDATE EvidenceBlobs SET refcount = refcount - 1 WHERE key = OLD.evidence_path;
+            END;
+        CREATE TRIGGER IF NOT EXISTS evidence_ref_{table.lower()}_update
+            AFTER UPDATE OF evidence_path ON {table}
+            WHEN OLD.evidence_path IS NOT NEW.evidence_path
+            BEGIN
+                UPDATE EvidenceBlobs SET refcount = refcount - 1 WHERE key = OLD.evidence_path;
+                UPDATE EvidenceBlobs SET refcount = refcount + 1 WHERE key = NEW.evidence_path;
+            END;
+        """)
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS EvidenceBlobs (
+        key TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        refcount INTEGER NOT NULL DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_put_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_evidence_blobs_refcount ON EvidenceBlobs(refcount);
+    """ + "".join(triggers))
+
+def recount_references(conn: sqlite3.Connection):
+    """Recompute every refcount from the evidence_path columns (repair after manual edits)"""
+    union = " UNION ALL ".join(f"SELECT evidence_path FROM {t} WHERE evidence_path IS NOT NULL" for t in EVIDENCE_TABLES)
+    conn.execute(f"""
+        UPDATE EvidenceBlobs SET refcount = (
+            SELECT COUNT(*) FROM ({union}) refs WHERE refs.evidence_path = EvidenceBlobs.key
+        )
+    """)
+    conn.commit()
+
+class EvidenceStore:
+    """Content-addressed, de-duplicating file store with a directory fan-out"""
+
+    def __init__(self, root: Path = DEFAULT_ROOT):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.tmp = self.root / "tmp"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        m = KEY_RE.match(key or "")
+        if not m:
+            raise ValueError(f"Not an evidence key: {key!r}")
+        digest = m.group(1)
+        return self.objects / digest[:2] / digest[2:4] / digest
+
+    def exists(self, key: str) -> bool:
+        return self.path_for(key).exists()
+
+    # ---------- Writes ----------
+    def put(self, stream: BinaryIO, user_id: Optional[str] = None) -> str:
+        """
+        Store a file-like object and return its key. The upload is hashed as it
+        is copied, so it is never held in memory; a file whose content is already
+        stored is discarded. The blob is registered in EvidenceBlobs (in the shard
+        of user_id, when sharded) with no references until a row points at it.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp)
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+
+            key = f"sha256:{digest.hexdigest()}"
+            self._place(tmp_name, key)
+            self._register(key, size, user_id)
+            # collect_garbage may have removed an old unreferenced copy while we
+            # were registering; the temp file is still here to restore it.
+            self._place(tmp_name, key)
+            return key
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def put_file(self, path: str, user_id: Optional[str] = None) -> str:
+        with open(path, "rb") as f:
+            return self.put(f, user_id)
+
+    def _place(self, tmp_name: str, key: str):
+        dest = self.path_for(key)
+        if dest.exists():
+            return
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # A hard link keeps tmp_name around for the second _place in put(); rename if links are unsupported.
+        try:
+            os.link(tmp_name, dest)
+        except FileExistsError:
+            pass
+        except OSError:
+            os.replace(tmp_name, dest)
+
+    def _register(self, key: str, size: int, user_id: Optional[str]):
+        if user_id is None and shard_router() is not None:
+            # The refcount must live in the shard whose rows will reference the blob
+            raise ValueError("Database is sharded: pass the owning user_id to put()")
+        conn = get_connection(user_id=user_id)
+        try:
+            ensure_evidence_tables(conn)
+            conn.execute("""
+                INSERT INTO EvidenceBlobs (key, size) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET last_put_at = CURRENT_TIMESTAMP
+            """, (key, size))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------- Reads ----------
+    def size(self, key: str) -> int:
+        return self.path_for(key).stat().st_size
+
+    @contextmanager
+    def mapped(self, key: str):
+        """Read-only memory map of a blob (b"" for empty blobs); pages are loaded on demand"""
+        path = self.path_for(key)
+        with path.open("rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mm
+            finally:
+                mm.close()
+
+    def read_range(self, key: str, start: int, end: Optional[int] = None) -> bytes:
+        """Bytes [start, end) of a blob, e.g. to answer an HTTP Range request"""
+        path = self.path_for(key)
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            if end is None:
+                end = os.fstat(fd).st_size
+            return os.pread(fd, max(0, end - start), start)
+        finally:
+            os.close(fd)
+
+    def iter_chunks(self, key: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Stream a blob without reading it fully into memory"""
+        with self.path_for(key).open("rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    # ---------- Garbage collection ----------
+    def collect_garbage(self, grace_seconds: int = DEFAULT_GRACE_SECONDS) -> Dict[str, int]:
+        """
+        Delete blobs whose refcount has dropped to zero and that were not
+        uploaded within the grace period. When sharded, a file is only removed
+        once no shard references it or uploaded it within the grace period.
+        """
+        cutoff = f"-{int(grace_seconds)} seconds"
+        stats = {"rows_deleted": 0, "files_deleted": 0, "bytes_freed": 0}
+
+        for shard in shard_indexes():
+            conns = self._lock_shards()
+            try:
+                conn = conns[shard]
+                candidates = [r[0] for r in conn.execute("""
+                    SELECT key FROM EvidenceBlobs
+                    WHERE refcount <= 0 AND last_put_at <= datetime('now', ?)
+                """, (cutoff,))]
+                if candidates:
+                    live_elsewhere = self._live_in_other_shards(conns, shard, candidates, cutoff)
+                    conn.executemany("DELETE FROM EvidenceBlobs WHERE key = ? AND refcount <= 0", ((k,) for k in candidates))
+                    stats["rows_deleted"] += len(candidates)
+                    # Files go while every shard's write lock is held, so no put() can register meanwhile
+                    for key in candidates:
+                        if key in live_elsewhere:
+                            continue
+                        path = self.path_for(key)
+                        try:
+                            stats["bytes_freed"] += path.stat().st_size
+                            path.unlink()
+                            stats["files_deleted"] += 1
+                        except FileNotFoundError:
+                            pass
+                for c in conns.values():
+                    c.commit()
+            except Exception:
+                for c in conns.values():
+                    c.rollback()
+                raise
+            finally:
+                for c in conns.values():
+                    c.close()
+        return stats
+
+    def _lock_shards(self) -> Dict[Optional[int], sqlite3.Connection]:
+        """Write-lock every shard, always in index order so concurrent collectors cannot deadlock"""
+        conns: Dict[Optional[int], sqlite3.Connection] = {}
+        try:
+            for shard in shard_indexes():
+                conn = get_connection(shard=shard)
+                conns[shard] = conn
+                ensure_evidence_tables(conn)
+                conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            for conn in conns.values():
+                conn.close()
+            raise
+        return conns
+
+    def _live_in_other_shards(self, conns: Dict[Optional[int], sqlite3.Connection], shard: Optional[int],
+                              keys: list, cutoff: str) -> set:
+        """Keys another shard still references, or registered within the grace period"""
+        live = set()
+        for other, conn in conns.items():
+            if other == shard:
+                continue
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ", ".join("?" for _ in batch)
+                live.update(r[0] for r in conn.execute(f"""
+                    SELECT key FROM EvidenceBlobs
+                    WHERE (refcount > 0 OR last_put_at > datetime('now', ?))
+                      AND key IN ({placeholders})
+                """, [cutoff, *batch]))
+        return live
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Streaming export of per-home data for HouseKeep
+
+Streams Homes, Tasks, TaskCompletions and Alerts out of SQLite in chunks and
+writes them as CSV, NDJSON or Parquet. Only one chunk is held in memory at a
+time, so exports of any size stay bounded by --chunk-size. When
+HOUSEKEEP_SHARDS is set (and --db is not), every shard is streamed into the
+same output files.
+
+Examples:
+    python export.py Tasks --format csv --out exports/
+    python export.py Alerts --format parquet --since 2024-01-01 --until 2025-01-01
+    python export.py TaskCompletions --columns id,completed_at,home_id --partition-by-home
+"""
+
+import argparse
+import csv
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from database import HouseKeepDB
+from db_props import shard_router
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# How each exportable table is joined to its home and which column the
+# --since/--until filters apply to.
+TABLE_SPECS = {
+    "Homes": {
+        "from": "Homes t",
+        "home_expr": "t.id",
+        "date_expr": "t.created_at",
+        "extra_columns": {},
+    },
+    "Tasks": {
+        "from": "Tasks t",
+        "home_expr": "t.home_id",
+        "date_expr": "t.next_due",
+        "extra_columns": {},
+    },
+    "TaskCompletions": {
+        "from": "TaskCompletions t JOIN Tasks k ON k.id = t.task_id",
+        "home_expr": "k.home_id",
+        "date_expr": "t.completed_at",
+        "extra_columns": {"home_id": ("k.home_id", "TEXT")},
+    },
+    "Alerts": {
+        "from": "Alerts t",
+        "home_expr": "t.home_id",
+        "date_expr": "t.onset",
+        "extra_columns": {},
+    },
+}
+
+FORMAT_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "parquet": "parquet"}
+
+# ---------- Writers ----------
+class CsvWriter:
+    def __init__(self, path: Path, columns: List[str], types: Dict[str, str]):
+        self.f = path.open("w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(columns)
+
+    def write(self, rows: List[tuple]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.f.close()
+
+class NdjsonWriter:
+    def __init__(self, path: Path, columns: List[str], types: Dict[str, str]):
+        self.f = path.open("w", encoding="utf-8")
+        self.columns = columns
+
+    def write(self, rows: List[tuple]):
+        self.f.writelines(json.dumps(dict(zip(self.columns, row)), default=str) + "\n" for row in rows)
+
+    def close(self):
+        self.f.close()
+
+class ParquetWriter:
+    """Writes each chunk as its own row group, using a schema derived from the SQLite column types"""
+
+    def __init__(self, path: Path, columns: List[str], types: Dict[str, str]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export requires pyarrow: pip3 install pyarrow")
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(c, _arrow_type(pa, types.get(c, ""))) for c in columns])
+        self.writer = pq.ParquetWriter(path.as_posix(), self.schema)
+
+    def write(self, rows: List[tuple]):
+        arrays = [
+            self.pa.array([row[i] for row in rows], type=self.schema.field(i).type)
+            for i in range(len(self.columns))
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"csv": CsvWriter, "ndjson": NdjsonWriter, "parquet": ParquetWriter}
+
+def _arrow_type(pa, declared: str):
+    declared = declared.upper()
+    if "INT" in declared:
+        return pa.int64()
+    if "REAL" in declared or "FLOA" in declared or "DOUB" in declared:
+        return pa.float64()
+    if "BOOL" in declared:
+        return pa.int8()
+    # TEXT, DATE and DATETIME are kept as the strings SQLite stores
+    return pa.string()
+
+# ---------- Query building ----------
+def table_columns(conn: sqlite3.Connection, table: str) -> Dict[str, tuple]:
+    """Map of exportable column name -> (SQL expression, declared type)"""
+    spec = TABLE_SPECS[table]
+    columns = {
+        row[1]: (f"t.{row[1]}", row[2])
+        for row in conn.execute(f"PRAGMA table_info({table})")
+    }
+    columns.update(spec["extra_columns"])
+    return columns
+
+def build_query(conn: sqlite3.Connection,
+                table: str,
+                columns: Optional[Sequence[str]] = None,
+                home_ids: Optional[Sequence[str]] = None,
+                since: Optional[str] = None,
+                until: Optional[str] = None,
+                order_by_home: bool = False) -> tuple:
+    """Returns (sql, params, column names, declared types) for an export"""
+    if table not in TABLE_SPECS:
+        raise ValueError(f"Unknown table {table}; choose from {', '.join(TABLE_SPECS)}")
+    spec = TABLE_SPECS[table]
+    available = table_columns(conn, table)
+
+    selected = list(columns) if columns else list(available)
+    unknown = [c for c in selected if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+
+    select_list = [f"{available[c][0]} AS {c}" for c in selected]
+    if order_by_home:
+        # Partition key travels as a trailing hidden column
+        select_list.append(f"{spec['home_expr']} AS _partition_home_id")
+
+    where = []
+    params: List[Any] = []
+    if home_ids:
+        where.append(f"{spec['home_expr']} IN ({', '.join('?' for _ in home_ids)})")
+        params.extend(home_ids)
+    if since:
+        where.append(f"{spec['date_expr']} >= ?")
+        params.append(since)
+    if until:
+        where.append(f"{spec['date_expr']} < ?")
+        params.append(until)
+
+    sql = f"SELECT {', '.join(select_list)} FROM {spec['from']}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if order_by_home:
+        sql += f" ORDER BY {spec['home_expr']}"
+
+    types = {c: available[c][1] for c in selected}
+    return sql, params, selected, types
+
+def iter_chunks(conn: sqlite3.Connection, sql: str, params: Sequence[Any], chunk_size: int) -> Iterator[List[tuple]]:
+    cur = conn.cursor()
+    # Plain tuples regardless of the connection's row_factory
+    cur.row_factory = None
+    cur.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def _iter_shard_chunks(conns: Sequence[sqlite3.Connection], sql: str, params: Sequence[Any],
+                       chunk_size: int) -> Iterator[List[tuple]]:
+    for conn in conns:
+        yield from iter_chunks(conn, sql, params, chunk_size)
+
+# ---------- Export ----------
+def export_table(conns: Union[sqlite3.Connection, Sequence[sqlite3.Connection]],
+                 table: str,
+                 out_dir: str,
+                 fmt: str = "csv",
+                 columns: Optional[Sequence[str]] = None,
+                 home_ids: Optional[Sequence[str]] = None,
+                 since: Optional[str] = None,
+                 until: Optional[str] = None,
+                 partition_by_home: bool = False,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Stream one table to out_dir. With partition_by_home, rows are written to
+    out_dir/home_id=<id>/<table>.<ext>, one file per home; otherwise to
+    out_dir/<table>.<ext>. conns may be one connection or one per shard;
+    shards are streamed one after another into the same files. Connections
+    must not use detect_types, so dates reach the writers as stored strings.
+    Returns the row count and files written.
+    """
+    if isinstance(conns, sqlite3.Connection):
+        conns = [conns]
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown format {fmt}; choose from {', '.join(WRITERS)}")
+    writer_cls = WRITERS[fmt]
+    filename = f"{table}.{FORMAT_EXTENSIONS[fmt]}"
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+
+    sql, params, names, types = build_query(conns[0], table, columns, home_ids, since, until,
+                                            order_by_home=partition_by_home)
+    files: List[str] = []
+    rows_written = 0
+
+    if not partition_by_home:
+        path = out / filename
+        writer = writer_cls(path, names, types)
+        try:
+            for rows in _iter_shard_chunks(conns, sql, params, chunk_size):
+                writer.write(rows)
+                rows_written += len(rows)
+        finally:
+            writer.close()
+        return {"rows": rows_written, "files": [path.as_posix()]}
+
+    # Rows arrive ordered by home within a shard and a home lives in exactly
+    # one shard, so only one partition writer is open at a time.
+    writer = None
+    current_home = object()
+    try:
+        for rows in _iter_shard_chunks(conns, sql, params, chunk_size):
+            start = 0
+            for i, row in enumerate(rows):
+                home_id = row[-1]
+                if home_id != current_home:
+                    if writer and i > start:
+                        writer.write([r[:-1] for r in rows[start:i]])
+                    if writer:
+                        writer.close()
+                    part_dir = out / f"home_id={home_id}"
+                    part_dir.mkdir(parents=True, exist_ok=True)
+                    writer = writer_cls(part_dir / filename, names, types)
+                    files.append((part_dir / filename).as_posix())
+                    current_home = home_id
+                    start = i
+            if writer and start < len(rows):
+                writer.write([r[:-1] for r in rows[start:]])
+            rows_written += len(rows)
+    finally:
+        if writer:
+            writer.close()
+    return {"rows": rows_written, "files": files}
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream HouseKeep tables to CSV, NDJSON or Parquet")
+    parser.add_argument("tables", nargs="+", choices=list(TABLE_SPECS), help="Tables to export")
+    parser.add_argument("--db", help="SQLite database path (default: every HOUSEKEEP_SHARDS shard, else housekeep.db)")
+    parser.add_argument("--out", default="exports", help="Output directory")
+    parser.add_argument("--format", dest="fmt", default="csv", choices=list(WRITERS))
+    parser.add_argument("--columns", help="Comma-separated column projection (applied to every table)")
+    parser.add_argument("--home", dest="home_ids", action="append", help="Only export this home (repeatable)")
+    parser.add_argument("--since", help="Inclusive lower bound on the table's date column")
+    parser.add_argument("--until", help="Exclusive upper bound on the table's date column")
+    parser.add_argument("--partition-by-home", action="store_true", help="Write one file per home")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    columns = [c.strip() for c in args.columns.split(",")] if args.columns else None
+
+    router = shard_router()
+    if args.db or router is None:
+        db = HouseKeepDB(args.db or "housekeep.db")
+    else:
+        db = HouseKeepDB(shard_paths=[p.as_posix() for p in router.paths])
+    conns = db.connect_all()
+    try:
+        for table in args.tables:
+            result = export_table(
+                conns, table, args.out, args.fmt,
+                columns=columns,
+                home_ids=args.home_ids,
+                since=args.since,
+                until=args.until,
+                partition_by_home=args.partition_by_home,
+                chunk_size=args.chunk_size,
+            )
+            print(f"✅ {table}: {result['rows']} rows -> {len(result['files'])} file(s)")
+    finally:
+        db.disconnect()
+
+if __name__ == "__main__":
+    main()
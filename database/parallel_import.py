@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Multi-process importer for archives of ATTOM property responses
+
+Worker processes read, parse and map response files with the same
+map_attom_property_to_home_fields used by import_property_json_file, and ship
+compact row tuples back to the parent process, which is the only writer and
+owns the SQLite connection. Each batch of homes is committed together with
+its ImportCheckpoint rows, so an interrupted run resumes where it stopped.
+
+Example:
+    python parallel_import.py <user_id> ../archives --workers 8
+    python parallel_import.py <user_id> ../archives --remap --restart --no-raw
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from db_props import get_connection, map_attom_property_to_home_fields
+from profile_cache import profile_cache
+
+DEFAULT_BATCH_SIZE = 500
+# Files handed to a worker per task; amortises inter-process overhead.
+FILES_PER_TASK = 64
+
+IMPORT_CHECKPOINT_DDL = """
+CREATE TABLE IF NOT EXISTS ImportCheckpoint (
+    user_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    home_id TEXT,
+    status TEXT NOT NULL CHECK (status IN ('done', 'error')),
+    error TEXT,
+    imported_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, path)
+);
+"""
+
+def ensure_import_tables(conn: sqlite3.Connection):
+    pk = [r[1] for r in sorted(conn.execute("PRAGMA table_info(ImportCheckpoint)"), key=lambda r: r[5]) if r[5]]
+    if pk == ["path"]:
+        # Checkpoints used to be keyed by path alone, so one user's import hid the file from every other user
+        conn.executescript("""
+        ALTER TABLE ImportCheckpoint RENAME TO _ImportCheckpoint_old;
+        """ + IMPORT_CHECKPOINT_DDL + """
+        INSERT INTO ImportCheckpoint (user_id, path, home_id, status, error, imported_at)
+        SELECT user_id, path, home_id, status, error, imported_at FROM _ImportCheckpoint_old
+        WHERE user_id IS NOT NULL;
+        DROP TABLE _ImportCheckpoint_old;
+        """)
+    conn.executescript(IMPORT_CHECKPOINT_DDL + """
+    CREATE TABLE IF NOT EXISTS RawProperties (
+        id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+        home_id TEXT,
+        source TEXT,
+        raw_json TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(home_id) REFERENCES Homes(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_homes_user_address ON Homes(user_id, address_text);
+    """)
+
+# ---------- Worker side ----------
+def parse_files(paths: List[str], store_raw: bool) -> List[tuple]:
+    """
+    Runs in a worker process. Returns one tuple per file:
+    ("ok", path, address_text, latitude, longitude, building_type, year_built, created_at, raw_or_None)
+    or ("error", path, message).
+    """
+    rows = []
+    for path in paths:
+        try:
+            raw = Path(path).read_text(encoding="utf-8")
+            props = json.loads(raw).get("property") or []
+            if not props:
+                raise ValueError("No property items found in JSON")
+            m = map_attom_property_to_home_fields(props[0])
+            if not m["address_text"]:
+                raise ValueError("Property has no address")
+            rows.append((
+                "ok", path,
+                m["address_text"], m["latitude"], m["longitude"],
+                m["building_type"], m["year_built"], m["created_at"],
+                raw if store_raw else None,
+            ))
+        except Exception as e:
+            rows.append(("error", path, str(e)))
+    return rows
+
+# ---------- Writer side ----------
+def _write_batch(conn: sqlite3.Connection, user_id: str, rows: List[tuple], remap: bool) -> Dict[str, int]:
+    counts = {"inserted": 0, "updated": 0, "errors": 0}
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for row in rows:
+            if row[0] == "error":
+                _, path, message = row
+                cur.execute("""
+                    INSERT OR REPLACE INTO ImportCheckpoint (path, user_id, home_id, status, error)
+                    VALUES (?, ?, NULL, 'error', ?)
+                """, (path, user_id, message))
+                counts["errors"] += 1
+                continue
+
+            _, path, address_text, lat, lon, building_type, year_built, created_at, raw = row
+            cur.execute("SELECT id FROM Homes WHERE user_id = ? AND address_text = ?", (user_id, address_text))
+            existing = cur.fetchone()
+            if existing:
+                home_id = existing[0]
+                if remap:
+                    cur.execute("""
+                        UPDATE Homes
+                        SET latitude = ?, longitude = ?, building_type = ?, year_built = ?
+                        WHERE id = ?
+                    """, (lat, lon, building_type, year_built, home_id))
+                    counts["updated"] += 1
+            else:
+                home_id = secrets.token_hex(16)
+                cur.execute("""
+                    INSERT INTO Homes (
+                        id, user_id, address_text, latitude, longitude, building_type,
+                        year_built, has_central_ac, created_at, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+                """, (home_id, user_id, address_text, lat, lon, building_type, year_built, created_at, created_at))
+                counts["inserted"] += 1
+
+            if raw is not None:
+                cur.execute("INSERT INTO RawProperties (home_id, source, raw_json) VALUES (?, 'attom', ?)", (home_id, raw))
+            cur.execute("""
+                INSERT OR REPLACE INTO ImportCheckpoint (path, user_id, home_id, status, error)
+                VALUES (?, ?, ?, 'done', NULL)
+            """, (path, user_id, home_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return counts
+
+def _chunks(items: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def print_progress(stats: Dict[str, float]):
+    rate = stats["processed"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    print(
+        f"\r📦 {stats['processed']}/{stats['total']} files "
+        f"({stats['inserted']} new, {stats['updated']} updated, {stats['errors']} errors) "
+        f"{rate:.0f} files/s",
+        end="", file=sys.stderr, flush=True,
+    )
+
+def import_archive(user_id: str,
+                   paths: List[str],
+                   workers: Optional[int] = None,
+                   store_raw: bool = True,
+                   remap: bool = False,
+                   batch_size: int = DEFAULT_BATCH_SIZE,
+                   restart: bool = False,
+                   progress: Optional[Callable[[Dict[str, float]], None]] = print_progress) -> Dict[str, float]:
+    """
+    Import ATTOM response files for user_id in parallel. Files already marked
+    done in ImportCheckpoint are skipped; files that errored are retried.
+    With remap=True, homes that already exist get their mapped fields rewritten;
+    restart=True drops this user's checkpoints first so every file is re-read.
+    Returns the final progress statistics.
+    """
+    conn = get_connection(user_id=user_id)
+    try:
+        ensure_import_tables(conn)
+        if restart:
+            conn.execute("DELETE FROM ImportCheckpoint WHERE user_id = ?", (user_id,))
+            conn.commit()
+        done = {r[0] for r in conn.execute(
+            "SELECT path FROM ImportCheckpoint WHERE user_id = ? AND status = 'done'", (user_id,)
+        )}
+        todo = [p for p in paths if p not in done]
+        stats = {
+            "total": len(todo), "processed": 0, "inserted": 0,
+            "updated": 0, "errors": 0, "skipped": len(paths) - len(todo), "elapsed": 0.0,
+        }
+        started = time.monotonic()
+        pending_rows: List[tuple] = []
+
+        def flush():
+            counts = _write_batch(conn, user_id, pending_rows, remap)
+            for k, v in counts.items():
+                stats[k] += v
+            stats["processed"] += len(pending_rows)
+            stats["elapsed"] = time.monotonic() - started
+            pending_rows.clear()
+            if progress:
+                progress(stats)
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            tasks = _chunks(todo, FILES_PER_TASK)
+            # Keep a bounded number of tasks in flight so results never pile up in memory.
+            max_in_flight = workers * 2
+            in_flight = set()
+            for chunk in tasks:
+                in_flight.add(pool.submit(parse_files, chunk, store_raw))
+                if len(in_flight) >= max_in_flight:
+                    break
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    pending_rows.extend(future.result())
+                    next_chunk = next(tasks, None)
+                    if next_chunk:
+                        in_flight.add(pool.submit(parse_files, next_chunk, store_raw))
+                if len(pending_rows) >= batch_size:
+                    flush()
+        if pending_rows:
+            flush()
+        stats["elapsed"] = time.monotonic() - started
+    finally:
+        conn.close()
+        # Homes were written directly rather than through insert_home, and a
+        # failed run may still have committed earlier batches.
+        profile_cache.clear()
+
+    if progress:
+        print(file=sys.stderr)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Import an archive of ATTOM responses in parallel")
+    parser.add_argument("user_id", help="Owner of the imported homes")
+    parser.add_argument("archive", help="Directory of ATTOM response files")
+    parser.add_argument("--pattern", default="*.json", help="Glob for response files (searched recursively)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Files committed per transaction")
+    parser.add_argument("--no-raw", action="store_true", help="Do not store raw JSON in RawProperties")
+    parser.add_argument("--remap", action="store_true", help="Rewrite mapped fields of homes that already exist")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints from earlier runs for this user")
+    args = parser.parse_args()
+
+    paths = sorted(p.as_posix() for p in Path(args.archive).rglob(args.pattern))
+    stats = import_archive(
+        args.user_id, paths,
+        workers=args.workers,
+        store_raw=not args.no_raw,
+        remap=args.remap,
+        batch_size=args.batch_size,
+        restart=args.restart,
+    )
+    print(f"✅ Imported {stats['processed']} files in {stats['elapsed']:.1f}s "
+          f"({stats['skipped']} already done, {stats['errors']} errors)")
+
+if __name__ == "__main__":
+    main()
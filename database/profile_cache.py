@@ -0,0 +1,157 @@
+# profile_cache.py
+"""
+In-process read-through cache for user and home profiles.
+
+Entries are keyed by ("user", user_id) or ("home", home_id), bounded by an LRU
+size limit and expire after a TTL. The db_props mutators invalidate affected
+keys on every write. Writes that bypass this process (e.g. the Node server)
+are only picked up once the TTL expires, so keep it short.
+
+Callers get their own deep copy of a cached profile, so mutating a result
+never changes what other callers see.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL_SECONDS = 30.0
+
+class ProfileCache:
+    """Thread-safe LRU + TTL cache with write-path invalidation and hit statistics"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Loads in flight per key, and a version bumped when such a key is
+        # invalidated so the racing load is not stored. Both only hold keys
+        # with a load in flight.
+        self._loading: Dict[Hashable, int] = {}
+        self._versions: Dict[Hashable, int] = {}
+        self._epoch = 0
+        # home_id -> user_id, so a home write can also drop its owner's profile.
+        # Only kept while that user's profile is cached or loading.
+        self._home_owner: Dict[str, str] = {}
+        self._owned_homes: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a copy of the cached value, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._forget(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return copy.deepcopy(value)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Read-through: return the cached value or call loader() and cache its result"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            self._loading[key] = self._loading.get(key, 0) + 1
+            version = (self._epoch, self._versions.get(key, 0))
+        value = None
+        try:
+            value = loader()
+        finally:
+            self._finish_load(key, value, version)
+        return copy.deepcopy(value)
+
+    def _finish_load(self, key: Hashable, value: Optional[Any], version: tuple):
+        with self._lock:
+            # Not stored if invalidated while we were loading; the value may already be stale.
+            if value is not None and (self._epoch, self._versions.get(key, 0)) == version:
+                self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._forget(evicted)
+                    self.evictions += 1
+            self._loading[key] -= 1
+            if not self._loading[key]:
+                del self._loading[key]
+                self._versions.pop(key, None)
+            self._forget(key)
+
+    def _forget(self, key: Hashable):
+        """Drop bookkeeping for a key that is neither cached nor loading (lock held)"""
+        if key in self._entries or key in self._loading:
+            return
+        if isinstance(key, tuple) and key[0] == "user":
+            for home_id in self._owned_homes.pop(key[1], ()):
+                if self._home_owner.get(home_id) == key[1]:
+                    del self._home_owner[home_id]
+
+    def remember_home_owner(self, home_id: str, user_id: str):
+        with self._lock:
+            user_key = ("user", user_id)
+            if user_key not in self._entries and user_key not in self._loading:
+                # No cached profile of this user for a home write to invalidate
+                return
+            previous = self._home_owner.get(home_id)
+            if previous and previous != user_id:
+                self._owned_homes.get(previous, set()).discard(home_id)
+            self._home_owner[home_id] = user_id
+            self._owned_homes.setdefault(user_id, set()).add(home_id)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._loading:
+                self._versions[key] = self._versions.get(key, 0) + 1
+            self._forget(key)
+
+    def invalidate_user(self, user_id: str):
+        self.invalidate(("user", user_id))
+
+    def invalidate_home(self, home_id: str):
+        """Drop a home profile and the profile of the user who owns it"""
+        self.invalidate(("home", home_id))
+        with self._lock:
+            owner = self._home_owner.get(home_id)
+        if owner:
+            self.invalidate_user(owner)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._home_owner.clear()
+            self._owned_homes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+# Shared instance used by db_props
+profile_cache = ProfileCache()
@@ -0,0 +1,316 @@
+# reminders.py
+"""
+Batched reminder dispatcher for Tasks.remind_channel.
+
+Selects active tasks due in a date window, groups them into one message per
+(channel, recipient), and sends the batches through pluggable channel
+backends on a worker pool with per-channel rate limits and retries.
+ReminderLog records an idempotency key per task/due date/channel, so a task
+is never reminded twice for the same due date even across runs.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from db_props import get_connection, shard_indexes
+
+# A 'pending' ReminderLog row older than this is treated as left behind by a
+# crashed run and claimed again. Keep it above the longest dispatch run.
+DEFAULT_PENDING_TIMEOUT_SECONDS = 3600
+
+def ensure_reminder_log(conn: sqlite3.Connection):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS ReminderLog (
+        idempotency_key TEXT PRIMARY KEY,
+        task_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        recipient TEXT,
+        due_date DATE,
+        status TEXT NOT NULL CHECK (status IN ('pending', 'sent', 'failed')),
+        attempts INTEGER DEFAULT 0,
+        error TEXT,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(task_id) REFERENCES Tasks(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_reminder_log_status ON ReminderLog(status);
+    """)
+
+def idempotency_key(task_id: str, due_date: str, channel: str) -> str:
+    return f"{task_id}:{due_date}:{channel}"
+
+# ---------- Channel backends ----------
+class ChannelBackend:
+    """
+    Base class for a reminder channel. Subclasses implement send(), which
+    delivers one batch to one recipient and raises on failure.
+    """
+    name = "none"
+    # Maximum sends per second across all workers; None disables limiting.
+    rate_per_second: Optional[float] = None
+
+    def send(self, recipient: str, reminders: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+class StubSink(ChannelBackend):
+    """
+    Local sink for testing: keeps every message in memory and optionally
+    appends it as a JSON line to an outbox file.
+    """
+
+    def __init__(self, outbox_path: Optional[str] = None, rate_per_second: Optional[float] = None):
+        self.outbox_path = Path(outbox_path) if outbox_path else None
+        self.rate_per_second = rate_per_second
+        self.sent: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def format(self, reminders: List[Dict[str, Any]]) -> Any:
+        return [r["title"] for r in reminders]
+
+    def send(self, recipient: str, reminders: List[Dict[str, Any]]):
+        message = {
+            "channel": self.name,
+            "recipient": recipient,
+            "body": self.format(reminders),
+            "sent_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            # Only record the message once it is delivered, so failed attempts never show as sent
+            if self.outbox_path:
+                with self.outbox_path.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps(message) + "\n")
+            self.sent.append(message)
+
+class StubSmsSink(StubSink):
+    name = "sms"
+
+    def format(self, reminders: List[Dict[str, Any]]) -> str:
+        lines = [f"- {r['title']} (due {r['next_due']})" for r in reminders]
+        return "HouseKeep reminders:\n" + "\n".join(lines)
+
+class StubCalendarSink(StubSink):
+    name = "calendar"
+
+    def format(self, reminders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {"summary": r["title"], "date": r["next_due"], "description": r.get("how_markdown") or ""}
+            for r in reminders
+        ]
+
+class RateLimiter:
+    """Token bucket shared by all workers sending on one channel"""
+
+    def __init__(self, rate_per_second: Optional[float]):
+        self.rate = rate_per_second
+        # The bucket must hold at least one token, or rates below 1/s never send
+        self.capacity = max(1.0, rate_per_second or 0.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# ---------- Selection ----------
+@dataclass
+class ReminderBatch:
+    channel: str
+    recipient: str
+    reminders: List[Dict[str, Any]] = field(default_factory=list)
+
+def _stale_cutoff(pending_timeout_seconds: int) -> str:
+    return f"-{int(pending_timeout_seconds)} seconds"
+
+def select_due_reminders(conn: sqlite3.Connection, start: str, end: str,
+                         pending_timeout_seconds: int = DEFAULT_PENDING_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Active tasks with a reminder channel whose next_due falls in [start, end]
+    and that have not already been sent (or recently claimed) for that due date.
+    """
+    conn.row_factory = sqlite3.Row
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT
+            t.id AS task_id,
+            t.title,
+            t.how_markdown,
+            t.next_due,
+            t.priority,
+            t.remind_channel AS channel,
+            h.id AS home_id,
+            h.address_text,
+            u.id AS user_id,
+            CASE t.remind_channel
+                WHEN 'sms' THEN u.phone_e164
+                ELSE COALESCE(u.email, u.id)
+            END AS recipient
+        FROM Tasks t INDEXED BY idx_tasks_next_due
+        JOIN Homes h ON h.id = t.home_id
+        JOIN Users u ON u.id = h.user_id
+        LEFT JOIN ReminderLog l
+            ON l.idempotency_key = t.id || ':' || t.next_due || ':' || t.remind_channel
+        WHERE t.next_due BETWEEN ? AND ?
+          AND t.status = 'active'
+          AND t.remind_channel != 'none'
+          AND (l.status IS NULL OR l.status = 'failed'
+               OR (l.status = 'pending' AND l.updated_at <= datetime('now', ?)))
+        ORDER BY t.remind_channel, recipient, t.next_due, t.priority DESC
+    """, (start, end, _stale_cutoff(pending_timeout_seconds)))
+    reminders = [dict(r) for r in cur.fetchall()]
+    for r in reminders:
+        # get_connection parses DATE columns to datetime.date; backends get ISO strings
+        if isinstance(r["next_due"], date):
+            r["next_due"] = r["next_due"].isoformat()
+    return reminders
+
+def group_by_recipient(reminders: List[Dict[str, Any]]) -> List[ReminderBatch]:
+    batches: Dict[tuple, ReminderBatch] = {}
+    for r in reminders:
+        key = (r["channel"], r["recipient"])
+        if key not in batches:
+            batches[key] = ReminderBatch(channel=r["channel"], recipient=r["recipient"])
+        batches[key].reminders.append(r)
+    return list(batches.values())
+
+def _claim(conn: sqlite3.Connection, reminders: List[Dict[str, Any]],
+           pending_timeout_seconds: int = DEFAULT_PENDING_TIMEOUT_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Mark reminders as pending in ReminderLog inside one write transaction.
+    Only reminders this run actually claimed are returned, so two overlapping
+    dispatchers never send the same reminder. Failed rows and pending rows
+    older than the timeout are claimed again.
+    """
+    claimed = []
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for r in reminders:
+            key = idempotency_key(r["task_id"], r["next_due"], r["channel"])
+            cur.execute("""
+                INSERT INTO ReminderLog (idempotency_key, task_id, channel, recipient, due_date, status)
+                VALUES (?, ?, ?, ?, ?, 'pending')
+                ON CONFLICT(idempotency_key) DO UPDATE SET
+                    status = 'pending',
+                    recipient = excluded.recipient,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE ReminderLog.status = 'failed'
+                   OR (ReminderLog.status = 'pending' AND ReminderLog.updated_at <= datetime('now', ?))
+            """, (key, r["task_id"], r["channel"], r["recipient"], r["next_due"],
+                  _stale_cutoff(pending_timeout_seconds)))
+            if cur.rowcount:
+                r["idempotency_key"] = key
+                claimed.append(r)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return claimed
+
+def _record(conn: sqlite3.Connection, batch: ReminderBatch, status: str, attempts: int, error: Optional[str]):
+    """
+    Store a batch's outcome in its own short transaction. The shard's write
+    lock must never be held while other batches are still being sent.
+    """
+    try:
+        conn.executemany("""
+            UPDATE ReminderLog
+            SET status = ?, attempts = attempts + ?, error = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE idempotency_key = ?
+        """, [(status, attempts, error, r["idempotency_key"]) for r in batch.reminders])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+# ---------- Dispatch ----------
+def _send_with_retries(backend: ChannelBackend, limiter: RateLimiter, batch: ReminderBatch,
+                       max_retries: int, backoff_seconds: float):
+    """Returns (status, attempts, error) for the batch"""
+    attempts = 0
+    while True:
+        attempts += 1
+        limiter.acquire()
+        try:
+            backend.send(batch.recipient, batch.reminders)
+            return "sent", attempts, None
+        except Exception as e:
+            if attempts > max_retries:
+                return "failed", attempts, str(e)
+            time.sleep(backoff_seconds * (2 ** (attempts - 1)))
+
+def dispatch_reminders(backends: List[ChannelBackend],
+                       start: Optional[str] = None,
+                       end: Optional[str] = None,
+                       max_workers: int = 16,
+                       max_retries: int = 3,
+                       backoff_seconds: float = 0.5,
+                       pending_timeout_seconds: int = DEFAULT_PENDING_TIMEOUT_SECONDS) -> Dict[str, int]:
+    """
+    Send every due reminder in [start, end] (defaults to today and tomorrow).
+    Reminders left pending by a crashed run are retried after pending_timeout_seconds.
+    Returns counts of selected, claimed, sent, failed and skipped reminders.
+    """
+    start = start or date.today().isoformat()
+    end = end or (date.today() + timedelta(days=1)).isoformat()
+    by_channel = {b.name: b for b in backends}
+    limiters = {b.name: RateLimiter(b.rate_per_second) for b in backends}
+    summary = {"selected": 0, "claimed": 0, "sent": 0, "failed": 0, "skipped": 0}
+
+    for shard in shard_indexes():
+        _dispatch_shard(shard, start, end, by_channel, limiters, summary,
+                        max_workers, max_retries, backoff_seconds, pending_timeout_seconds)
+    return summary
+
+def _dispatch_shard(shard: Optional[int], start: str, end: str,
+                    by_channel: Dict[str, ChannelBackend], limiters: Dict[str, RateLimiter],
+                    summary: Dict[str, int], max_workers: int, max_retries: int,
+                    backoff_seconds: float, pending_timeout_seconds: int):
+    conn = get_connection(shard=shard)
+    try:
+        ensure_reminder_log(conn)
+        selected = select_due_reminders(conn, start, end, pending_timeout_seconds)
+        summary["selected"] += len(selected)
+
+        # No backend for the channel or nobody to send to: leave unclaimed for a later run.
+        sendable = [r for r in selected if r["channel"] in by_channel and r["recipient"]]
+        summary["skipped"] += len(selected) - len(sendable)
+
+        claimed = _claim(conn, sendable, pending_timeout_seconds)
+        summary["claimed"] += len(claimed)
+        batches = group_by_recipient(claimed)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(_send_with_retries, by_channel[b.channel], limiters[b.channel],
+                            b, max_retries, backoff_seconds): b
+                for b in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                status, attempts, error = future.result()
+                _record(conn, batch, status, attempts, error)
+                summary[status] += len(batch.reminders)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sms = StubSmsSink(outbox_path="sms_outbox.jsonl")
+    calendar = StubCalendarSink(outbox_path="calendar_outbox.jsonl")
+    print(dispatch_reminders([sms, calendar]))
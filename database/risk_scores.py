@@ -0,0 +1,280 @@
+# risk_scores.py
+"""
+Vectorized home-risk scoring for HouseKeep.
+
+Every home is scored in one pass over columnar NumPy/pandas arrays built from
+Homes, the latest RawProperties payload, active Alerts and overdue Tasks.
+Scores are cached in HomeRiskScores together with a hash of each home's
+inputs, so a refresh only rescores homes whose inputs changed.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from db_props import get_connection, shard_indexes
+
+# Maximum points each component contributes; the weights sum to 100.
+WEIGHTS = {
+    "age": 25.0,
+    "building_type": 10.0,
+    "no_central_ac": 10.0,
+    "alerts": 30.0,
+    "overdue_tasks": 15.0,
+    "lot": 5.0,
+    "levels": 5.0,
+}
+
+BUILDING_TYPE_RISK = {
+    "house": 0.6,
+    "townhome": 0.5,
+    "condo": 0.4,
+    "apartment": 0.3,
+    "other": 0.5,
+}
+
+SEVERITY_RANK_SQL = """
+    CASE severity
+        WHEN 'Extreme' THEN 4
+        WHEN 'Severe' THEN 3
+        WHEN 'Moderate' THEN 2
+        WHEN 'Minor' THEN 1
+        ELSE 0
+    END
+"""
+
+# Homes older than this many years get the full age component.
+MAX_AGE_YEARS = 100
+# Overdue task count at which the overdue component saturates.
+MAX_OVERDUE_TASKS = 5
+# Lot size (sq ft) at which the lot component saturates.
+MAX_LOT_SQFT = 43560.0
+MAX_LEVELS = 4
+
+# Columns whose change forces a home to be rescored. score_year is the year
+# the age component is measured against, so every score ages on January 1.
+SIGNATURE_COLUMNS = [
+    "year_built",
+    "building_type",
+    "has_central_ac",
+    "raw_rowid",
+    "max_severity",
+    "active_alerts",
+    "overdue_tasks",
+    "score_year",
+]
+# Hashed with fixed dtypes: a NULL in one row must not turn a whole column
+# into float64 and change every home's hash.
+TEXT_SIGNATURE_COLUMNS = {"building_type"}
+
+def ensure_risk_table(conn: sqlite3.Connection):
+    conn.executescript("""
+    CREATE TABLE IF NOT EXISTS HomeRiskScores (
+        home_id TEXT PRIMARY KEY,
+        score REAL NOT NULL,
+        input_hash INTEGER NOT NULL,
+        scored_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(home_id) REFERENCES Homes(id) ON DELETE CASCADE
+    );
+    CREATE INDEX IF NOT EXISTS idx_home_risk_scores_score ON HomeRiskScores(score);
+    """)
+
+def _sql_timestamp(now: datetime) -> str:
+    return now.strftime("%Y-%m-%d %H:%M:%S")
+
+def _utc_timestamp(now: datetime) -> str:
+    """now in UTC, as SQLite's datetime() prints it (naive values are taken as local time)"""
+    return _sql_timestamp(now.astimezone(timezone.utc))
+
+def signature_hash(df: pd.DataFrame) -> np.ndarray:
+    """Per-row int64 hash of SIGNATURE_COLUMNS, independent of how pandas inferred their dtypes"""
+    typed = pd.DataFrame({
+        c: df[c].astype("string") if c in TEXT_SIGNATURE_COLUMNS
+        else pd.to_numeric(df[c], errors="coerce").astype("Float64")
+        for c in SIGNATURE_COLUMNS
+    })
+    return pd.util.hash_pandas_object(typed, index=False).to_numpy().view(np.int64)
+
+def load_signatures(conn: sqlite3.Connection, now: datetime) -> pd.DataFrame:
+    """One row per home with every input that can change its score, except the raw JSON itself."""
+    query = f"""
+        SELECT
+            h.id AS home_id,
+            h.year_built,
+            h.building_type,
+            h.has_central_ac,
+            r.raw_rowid,
+            COALESCE(a.max_severity, 0) AS max_severity,
+            COALESCE(a.active_alerts, 0) AS active_alerts,
+            COALESCE(t.overdue_tasks, 0) AS overdue_tasks
+        FROM Homes h
+        LEFT JOIN (
+            SELECT home_id, MAX(rowid) AS raw_rowid
+            FROM RawProperties
+            GROUP BY home_id
+        ) r ON r.home_id = h.id
+        LEFT JOIN (
+            SELECT home_id, MAX({SEVERITY_RANK_SQL}) AS max_severity, COUNT(*) AS active_alerts
+            FROM Alerts
+            -- datetime() normalises ISO onsets with 'T' and UTC offsets (as sent by NWS)
+            WHERE datetime(onset) <= :now AND datetime(expires_at) >= :now
+            GROUP BY home_id
+        ) a ON a.home_id = h.id
+        LEFT JOIN (
+            SELECT home_id, COUNT(*) AS overdue_tasks
+            FROM Tasks
+            WHERE status = 'active' AND next_due < :today
+            GROUP BY home_id
+        ) t ON t.home_id = h.id
+    """
+    params = {"now": _utc_timestamp(now), "today": now.date().isoformat()}
+    df = pd.read_sql_query(query, conn, params=params)
+    df["score_year"] = now.year
+    df["input_hash"] = signature_hash(df)
+    return df
+
+def load_lot_attributes(conn: sqlite3.Connection, raw_rowids: pd.Series) -> pd.DataFrame:
+    """
+    Pull lot/building attributes out of RawProperties.raw_json with SQLite's JSON
+    functions, so the payloads are never parsed row by row in Python.
+    """
+    rowids = raw_rowids.dropna().astype(np.int64).unique()
+    if len(rowids) == 0:
+        return pd.DataFrame(columns=["raw_rowid", "lot_sqft", "pooltype", "levels"])
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _risk_rowids (rowid_ INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM _risk_rowids")
+    conn.executemany("INSERT INTO _risk_rowids (rowid_) VALUES (?)", ((int(r),) for r in rowids))
+    try:
+        return pd.read_sql_query("""
+            SELECT
+                r.rowid AS raw_rowid,
+                json_extract(r.raw_json, '$.property[0].lot.lotsize2') AS lot_sqft,
+                json_extract(r.raw_json, '$.property[0].lot.pooltype') AS pooltype,
+                json_extract(r.raw_json, '$.property[0].building.summary.levels') AS levels
+            FROM RawProperties r
+            JOIN _risk_rowids k ON k.rowid_ = r.rowid
+            WHERE json_valid(r.raw_json)
+        """, conn)
+    finally:
+        conn.execute("DELETE FROM _risk_rowids")
+
+def compute_risk_scores(features: pd.DataFrame, now: Optional[datetime] = None) -> np.ndarray:
+    """
+    Score every row of `features` at once. Expects the signature columns plus
+    lot_sqft, pooltype and levels; missing values fall back to a neutral midpoint.
+    Returns a float array of scores in [0, 100].
+    """
+    now = now or datetime.now()
+
+    year_built = pd.to_numeric(features["year_built"], errors="coerce").to_numpy(dtype=float)
+    age = np.clip((now.year - year_built) / MAX_AGE_YEARS, 0.0, 1.0)
+    age = np.where(np.isnan(age), 0.5, age)
+
+    building = features["building_type"].map(BUILDING_TYPE_RISK).fillna(BUILDING_TYPE_RISK["other"]).to_numpy(dtype=float)
+
+    has_ac = pd.to_numeric(features["has_central_ac"], errors="coerce").fillna(0).to_numpy(dtype=float)
+    no_ac = (has_ac == 0).astype(float)
+
+    severity = features["max_severity"].to_numpy(dtype=float) / 4.0
+
+    overdue = np.minimum(features["overdue_tasks"].to_numpy(dtype=float), MAX_OVERDUE_TASKS) / MAX_OVERDUE_TASKS
+
+    lot_sqft = pd.to_numeric(features["lot_sqft"], errors="coerce").to_numpy(dtype=float)
+    lot = np.clip(np.log1p(lot_sqft) / np.log1p(MAX_LOT_SQFT), 0.0, 1.0)
+    lot = np.where(np.isnan(lot), 0.5, lot)
+    has_pool = features["pooltype"].fillna("").str.upper().str.contains("POOL") & ~features["pooltype"].fillna("").str.upper().str.startswith("NO")
+    lot = np.maximum(lot, has_pool.to_numpy(dtype=float))
+
+    levels = pd.to_numeric(features["levels"], errors="coerce").to_numpy(dtype=float)
+    levels = np.clip((levels - 1) / (MAX_LEVELS - 1), 0.0, 1.0)
+    levels = np.where(np.isnan(levels), 0.0, levels)
+
+    score = (
+        WEIGHTS["age"] * age
+        + WEIGHTS["building_type"] * building
+        + WEIGHTS["no_central_ac"] * no_ac
+        + WEIGHTS["alerts"] * severity
+        + WEIGHTS["overdue_tasks"] * overdue
+        + WEIGHTS["lot"] * lot
+        + WEIGHTS["levels"] * levels
+    )
+    return np.round(score, 2)
+
+def refresh_risk_scores(force: bool = False, now: Optional[datetime] = None) -> int:
+    """
+    Rescore homes whose inputs changed since the last run (or every home when
+    force=True) and drop cached scores for deleted homes.
+    Returns the number of homes rescored.
+    """
+    now = now or datetime.now()
+    return sum(_refresh_shard(shard, force, now) for shard in shard_indexes())
+
+def _refresh_shard(shard: Optional[int], force: bool, now: datetime) -> int:
+    conn = get_connection(shard=shard)
+    try:
+        ensure_risk_table(conn)
+        signatures = load_signatures(conn, now)
+        cached = pd.read_sql_query("SELECT home_id, input_hash AS cached_hash FROM HomeRiskScores", conn)
+
+        merged = signatures.merge(cached, on="home_id", how="left")
+        if force:
+            changed = merged
+        else:
+            changed = merged[merged["cached_hash"].isna() | (merged["cached_hash"] != merged["input_hash"])]
+
+        stale = np.setdiff1d(cached["home_id"].to_numpy(), signatures["home_id"].to_numpy())
+        if len(stale):
+            conn.executemany("DELETE FROM HomeRiskScores WHERE home_id = ?", ((h,) for h in stale))
+
+        if not changed.empty:
+            lots = load_lot_attributes(conn, changed["raw_rowid"])
+            features = changed.merge(lots, on="raw_rowid", how="left")
+            features["score"] = compute_risk_scores(features, now)
+            conn.executemany("""
+                INSERT INTO HomeRiskScores (home_id, score, input_hash, scored_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(home_id) DO UPDATE SET
+                    score = excluded.score,
+                    input_hash = excluded.input_hash,
+                    scored_at = excluded.scored_at
+            """, zip(
+                features["home_id"].tolist(),
+                features["score"].tolist(),
+                features["input_hash"].tolist(),
+                [_sql_timestamp(now)] * len(features),
+            ))
+
+        conn.commit()
+        return len(changed)
+    finally:
+        conn.close()
+
+def load_risk_scores(min_score: Optional[float] = None) -> pd.DataFrame:
+    """Cached scores joined with the owning user, highest risk first."""
+    query = """
+        SELECT s.home_id, h.user_id, h.address_text, s.score, s.scored_at
+        FROM HomeRiskScores s
+        JOIN Homes h ON h.id = s.home_id
+    """
+    params = ()
+    if min_score is not None:
+        query += " WHERE s.score >= ?"
+        params = (min_score,)
+
+    frames = []
+    for shard in shard_indexes():
+        conn = get_connection(shard=shard)
+        try:
+            ensure_risk_table(conn)
+            frames.append(pd.read_sql_query(query, conn, params=params))
+        finally:
+            conn.close()
+    return pd.concat(frames, ignore_index=True).sort_values("score", ascending=False, ignore_index=True)
+
+if __name__ == "__main__":
+    rescored = refresh_risk_scores()
+    print(f"Rescored {rescored} homes")
+    print(load_risk_scores().head(20).to_string(index=False))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Sharded multi-file SQLite backend for HouseKeep
+
+Users and everything hanging off them (Homes, Contacts, Tasks, ...) are
+partitioned across N database files by a stable hash of user_id, so writes
+for different users contend on different SQLite writer locks. Single-user
+queries go to one shard; cross-shard scans fan out over a thread pool.
+
+Examples:
+    python sharding.py init shard0.db shard1.db shard2.db shard3.db
+    python sharding.py rebalance --from shard0.db,shard1.db --to shard0.db,shard1.db,shard2.db
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Per-user tables in parent-before-child order, with the rows that belong to
+# the users listed in the temp table _move. Tables missing from a shard are skipped.
+USER_OWNED_TABLES = [
+    ("Users", "id IN (SELECT user_id FROM _move)"),
+    ("Homes", "user_id IN (SELECT user_id FROM _move)"),
+    ("RawProperties", "home_id IN (SELECT id FROM main.Homes WHERE user_id IN (SELECT user_id FROM _move))"),
+    ("Contacts", "home_id IN (SELECT id FROM main.Homes WHERE user_id IN (SELECT user_id FROM _move))"),
+    ("Tasks", "home_id IN (SELECT id FROM main.Homes WHERE user_id IN (SELECT user_id FROM _move))"),
+    ("Alerts", "home_id IN (SELECT id FROM main.Homes WHERE user_id IN (SELECT user_id FROM _move))"),
+    ("HomeRiskScores", "home_id IN (SELECT id FROM main.Homes WHERE user_id IN (SELECT user_id FROM _move))"),
+    ("TaskCompletions", """task_id IN (
+        SELECT t.id FROM main.Tasks t JOIN main.Homes h ON h.id = t.home_id
+        WHERE h.user_id IN (SELECT user_id FROM _move))"""),
+    ("ReminderLog", """task_id IN (
+        SELECT t.id FROM main.Tasks t JOIN main.Homes h ON h.id = t.home_id
+        WHERE h.user_id IN (SELECT user_id FROM _move))"""),
+    ("ImportCheckpoint", "user_id IN (SELECT user_id FROM _move)"),
+]
+
+# Tables shared by users in a shard. Moved users take a copy of the rows they
+# reference; the source rows stay for the users left behind. Reference counts
+# start at zero in the copy and are rebuilt by the triggers as rows move in.
+SHARED_TABLES = [
+    ("EvidenceBlobs", """key IN (
+        SELECT t.evidence_path FROM main.Tasks t JOIN main.Homes h ON h.id = t.home_id
+        WHERE h.user_id IN (SELECT user_id FROM _move)
+        UNION
+        SELECT c.evidence_path FROM main.TaskCompletions c
+        JOIN main.Tasks t ON t.id = c.task_id JOIN main.Homes h ON h.id = t.home_id
+        WHERE h.user_id IN (SELECT user_id FROM _move))"""),
+]
+
+# Homes whose shard locate_home() remembers (least recently used dropped first)
+DEFAULT_HOME_CACHE_SIZE = 10000
+
+def shard_for(user_id: str, shard_count: int) -> int:
+    """
+    Jump consistent hash of user_id. Stable across processes and Python
+    versions, unlike hash(), and growing from N to N+1 shards only moves
+    about 1/(N+1) of the users.
+    """
+    key = int.from_bytes(hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest(), "big")
+    bucket, j = -1, 0
+    while j < shard_count:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+class ShardRouter:
+    """Routes connections to one of N SQLite files by hashed user_id"""
+
+    def __init__(self, paths: Sequence[str], max_workers: Optional[int] = None,
+                 home_cache_size: int = DEFAULT_HOME_CACHE_SIZE):
+        if not paths:
+            raise ValueError("ShardRouter needs at least one database path")
+        self.paths = [Path(p) for p in paths]
+        self.max_workers = max_workers or len(self.paths)
+        # home_id -> shard, filled by locate_home(); bounded LRU
+        self.home_cache_size = home_cache_size
+        self._home_shards: "OrderedDict[str, int]" = OrderedDict()
+        self._home_lock = threading.Lock()
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.paths)
+
+    def shard_index(self, user_id: str) -> int:
+        return shard_for(user_id, self.shard_count)
+
+    def connect(self, shard: int, row_factory=None) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.paths[shard].as_posix(), detect_types=sqlite3.PARSE_DECLTYPES|sqlite3.PARSE_COLNAMES)
+        if row_factory:
+            conn.row_factory = row_factory
+        return conn
+
+    def connect_for_user(self, user_id: str, row_factory=None) -> sqlite3.Connection:
+        return self.connect(self.shard_index(user_id), row_factory)
+
+    def query_shard(self, shard: int, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        conn = self.connect(shard, row_factory=sqlite3.Row)
+        try:
+            return [dict(r) for r in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def fan_out(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        """
+        Run a read query on every shard in parallel and concatenate the rows.
+        Aggregates, ORDER BY and LIMIT apply per shard; callers combine them.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            results = pool.map(lambda shard: self.query_shard(shard, query, params), range(self.shard_count))
+            return [row for rows in results for row in rows]
+
+    def locate_home(self, home_id: str) -> Optional[int]:
+        """
+        Shard holding a home, found by fan-out and remembered for the
+        home_cache_size most recently located homes. Callers that find the
+        home gone from that shard should forget_home() it.
+        """
+        with self._home_lock:
+            shard = self._home_shards.get(home_id)
+            if shard is not None:
+                self._home_shards.move_to_end(home_id)
+                return shard
+        rows = self.fan_out("SELECT user_id FROM Homes WHERE id = ?", (home_id,))
+        if not rows:
+            return None
+        shard = self.shard_index(rows[0]["user_id"])
+        with self._home_lock:
+            self._home_shards[home_id] = shard
+            self._home_shards.move_to_end(home_id)
+            while len(self._home_shards) > self.home_cache_size:
+                self._home_shards.popitem(last=False)
+        return shard
+
+    def forget_home(self, home_id: str):
+        with self._home_lock:
+            self._home_shards.pop(home_id, None)
+
+    def init_shards(self, schema_sql: str):
+        """Create the schema in every shard file that does not have a Users table yet"""
+        for shard in range(self.shard_count):
+            conn = self.connect(shard)
+            try:
+                exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Users'"
+                ).fetchone()
+                if not exists:
+                    conn.executescript(schema_sql)
+                    conn.commit()
+            finally:
+                conn.close()
+
+# ---------- Rebalancing ----------
+def _table_columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def _copy_missing_tables(src: sqlite3.Connection, dst_path: Path):
+    """Create tables, indexes and triggers that exist in src but not yet in dst_path"""
+    dst = sqlite3.connect(dst_path.as_posix())
+    try:
+        have = {r[0] for r in dst.execute("SELECT name FROM sqlite_master")}
+        tables = [t for t, _ in USER_OWNED_TABLES + SHARED_TABLES]
+        placeholders = ", ".join("?" for _ in tables)
+        ddl = src.execute(f"""
+            SELECT name, sql FROM main.sqlite_master
+            WHERE tbl_name IN ({placeholders}) AND sql IS NOT NULL
+            ORDER BY CASE type WHEN 'table' THEN 0 WHEN 'index' THEN 1 ELSE 2 END
+        """, tables).fetchall()
+        for name, sql in ddl:
+            if name not in have:
+                dst.execute(sql)
+        dst.commit()
+    finally:
+        dst.close()
+
+def _move_users(src: sqlite3.Connection, dst_path: Path, user_ids: List[str]) -> int:
+    """
+    Copy users and their dependent rows into dst_path, then delete them from
+    src, in one transaction. src must be in autocommit mode (isolation_level=None).
+    """
+    src.execute("ATTACH DATABASE ? AS dst", (dst_path.as_posix(),))
+    try:
+        tables = []
+        for table, where in USER_OWNED_TABLES:
+            src_cols = _table_columns(src, "main", table)
+            dst_cols = set(_table_columns(src, "dst", table))
+            if src_cols and dst_cols:
+                tables.append((table, where, [c for c in src_cols if c in dst_cols]))
+
+        shared = []
+        for table, where in SHARED_TABLES:
+            src_cols = _table_columns(src, "main", table)
+            dst_cols = set(_table_columns(src, "dst", table))
+            if src_cols and dst_cols:
+                shared.append((table, where, [c for c in src_cols if c in dst_cols]))
+
+        src.execute("BEGIN IMMEDIATE")
+        try:
+            src.execute("CREATE TEMP TABLE IF NOT EXISTS _move (user_id TEXT PRIMARY KEY)")
+            src.execute("DELETE FROM _move")
+            src.executemany("INSERT INTO _move (user_id) VALUES (?)", ((u,) for u in user_ids))
+            for table, where, cols in shared:
+                col_list = ", ".join(cols)
+                select_list = ", ".join("0" if c == "refcount" else c for c in cols)
+                src.execute(f"INSERT OR IGNORE INTO dst.{table} ({col_list}) SELECT {select_list} FROM main.{table} WHERE {where}")
+            for table, where, cols in tables:
+                col_list = ", ".join(cols)
+                src.execute(f"INSERT INTO dst.{table} ({col_list}) SELECT {col_list} FROM main.{table} WHERE {where}")
+            # Children first, so the WHERE clauses can still see their parents
+            for table, where, _ in reversed(tables):
+                src.execute(f"DELETE FROM main.{table} WHERE {where}")
+            src.execute("COMMIT")
+        except Exception:
+            src.execute("ROLLBACK")
+            raise
+        return len(user_ids)
+    finally:
+        src.execute("DETACH DATABASE dst")
+
+def rebalance(old_paths: Sequence[str], new_paths: Sequence[str], schema_sql: str,
+              batch_size: int = 500) -> Dict[str, int]:
+    """
+    Move every user whose shard changes between the old and new layouts.
+    Files present in both layouts keep the users that still hash to them.
+    Sync the alert history first (alert_history.py sync), or run
+    `alert_history.py sync --full` afterwards.
+    Returns the number of users moved out of each old shard.
+    """
+    old = ShardRouter(old_paths)
+    new = ShardRouter(new_paths)
+    new.init_shards(schema_sql)
+    new_index = {p.resolve(): i for i, p in enumerate(new.paths)}
+
+    moved: Dict[str, int] = {}
+    for shard, path in enumerate(old.paths):
+        conn = old.connect(shard)
+        conn.isolation_level = None
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            user_ids = [r[0] for r in conn.execute("SELECT id FROM Users")]
+            here = new_index.get(path.resolve())
+            by_target: Dict[int, List[str]] = {}
+            for user_id in user_ids:
+                target = new.shard_index(user_id)
+                if target != here:
+                    by_target.setdefault(target, []).append(user_id)
+
+            count = 0
+            for target, users in by_target.items():
+                _copy_missing_tables(conn, new.paths[target])
+                for i in range(0, len(users), batch_size):
+                    count += _move_users(conn, new.paths[target], users[i:i + batch_size])
+            moved[path.as_posix()] = count
+        finally:
+            conn.close()
+    return moved
+
+def main():
+    # Imported here: db_props itself imports this module.
+    from db_props import load_schema_sql
+
+    parser = argparse.ArgumentParser(description="Manage HouseKeep SQLite shards")
+    sub = parser.add_subparsers(dest="command", required=True)
+    init = sub.add_parser("init", help="Create the schema in each shard file")
+    init.add_argument("paths", nargs="+")
+    reb = sub.add_parser("rebalance", help="Move users between shard layouts")
+    reb.add_argument("--from", dest="old", required=True, help="Comma-separated current shard files")
+    reb.add_argument("--to", dest="new", required=True, help="Comma-separated target shard files")
+    reb.add_argument("--batch-size", type=int, default=500, help="Users moved per transaction")
+    parser.add_argument("--schema", default=str(Path(__file__).parent / "database_schema.sql"),
+                        help="Schema used to create missing shard files")
+    args = parser.parse_args()
+
+    schema_sql = load_schema_sql(Path(args.schema))
+    if args.command == "init":
+        ShardRouter(args.paths).init_shards(schema_sql)
+        print(f"✅ Initialized {len(args.paths)} shard(s)")
+    else:
+        moved = rebalance(args.old.split(","), args.new.split(","), schema_sql, args.batch_size)
+        for path, count in moved.items():
+            print(f"   - {path}: moved {count} user(s)")
+        print(f"✅ Rebalanced {sum(moved.values())} user(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write stress harness for the HouseKeep SQLite schema
+
+Generates a database from database_schema.sql, then runs a realistic mix of
+profile/dashboard reads and property-import/alert/task-completion writes from
+thread and process pools. Each journal mode x busy_timeout x pool combination
+gets a fresh copy of the database, and the report shows throughput, latency
+percentiles, busy/locked errors and time spent waiting for the write lock.
+
+Example:
+    python stress_test.py --workers 8 --duration 10 --journal-modes delete,wal --busy-timeouts 0,100,5000
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Manager
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+from db_props import load_schema_sql, map_attom_property_to_home_fields
+
+SCHEMA_PATH = Path(__file__).parent / "database_schema.sql"
+ATTOM_SAMPLE_PATH = Path(__file__).parent.parent / "TESTINGATTOM.json"
+
+DEFAULT_MIX = {
+    "read_profile": 50,
+    "read_dashboard": 30,
+    "insert_alert": 10,
+    "complete_task": 7,
+    "import_property": 3,
+}
+WRITE_OPS = {"insert_alert", "complete_task", "import_property"}
+
+SEVERITIES = ["Minor", "Moderate", "Severe", "Extreme"]
+
+# How long workers may take to start (spawn, imports) before the run is abandoned
+START_BARRIER_TIMEOUT_S = 120
+
+# ---------- Database generation ----------
+def user_id(n: int) -> str:
+    return f"u{n:08d}"
+
+def home_id(user: int, k: int) -> str:
+    return f"h{user:08d}{k:02d}"
+
+def task_id(user: int, k: int, t: int) -> str:
+    return f"t{user:08d}{k:02d}{t:02d}"
+
+def generate_database(path: Path, users: int, homes_per_user: int, tasks_per_home: int, seed: int = 0):
+    """Populate a fresh database with deterministic ids so workers can pick rows without a lookup"""
+    rng = random.Random(seed)
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(path.as_posix())
+    try:
+        conn.executescript(load_schema_sql(SCHEMA_PATH))
+        conn.executemany(
+            "INSERT INTO Users (id, username, display_name, phone_e164, email, password_hash) VALUES (?, ?, ?, ?, ?, ?)",
+            ((user_id(u), f"user{u}", f"User {u}", f"+1312{u:07d}", f"user{u}@example.com", "x") for u in range(users)),
+        )
+        conn.executemany("""
+            INSERT INTO Homes (id, user_id, address_text, latitude, longitude, building_type, year_built, has_central_ac)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (home_id(u, k), user_id(u), f"{u}{k} N Test St, Chicago, IL 606{k:02d}",
+             41.8 + rng.random() / 10, -87.6 - rng.random() / 10,
+             rng.choice(["apartment", "condo", "house", "townhome", "other"]),
+             rng.randint(1900, 2020), rng.randint(0, 1))
+            for u in range(users) for k in range(homes_per_user)
+        ))
+        conn.executemany("""
+            INSERT INTO Contacts (home_id, name, phone_e164, relationship, is_primary) VALUES (?, ?, ?, ?, ?)
+        """, (
+            (home_id(u, k), f"Contact {u}", f"+1773{u:07d}", "Family", 1)
+            for u in range(users) for k in range(homes_per_user)
+        ))
+        conn.executemany("""
+            INSERT INTO Tasks (id, home_id, title, category, frequency_days, next_due, status, priority, remind_channel)
+            VALUES (?, ?, ?, ?, ?, date('now', ?), ?, ?, ?)
+        """, (
+            (task_id(u, k, t), home_id(u, k), f"Task {t}", rng.choice(["Safety", "Seasonal", "General", "Health"]),
+             rng.choice([30, 90, 180, 365]), f"{rng.randint(-30, 60)} days",
+             rng.choice(["active", "active", "active", "snoozed", "completed"]), rng.randint(0, 3),
+             rng.choice(["none", "calendar", "sms"]))
+            for u in range(users) for k in range(homes_per_user) for t in range(tasks_per_home)
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+
+# ---------- Operations ----------
+def op_read_profile(conn: sqlite3.Connection, rng: random.Random, shape: Dict[str, int]):
+    uid = user_id(rng.randrange(shape["users"]))
+    conn.execute("SELECT * FROM Users WHERE id = ?", (uid,)).fetchone()
+    homes = conn.execute("SELECT * FROM Homes WHERE user_id = ?", (uid,)).fetchall()
+    for h in homes:
+        conn.execute("SELECT * FROM Contacts WHERE home_id = ?", (h[0],)).fetchall()
+        conn.execute(
+            "SELECT * FROM Tasks WHERE home_id = ? AND status IN ('active', 'snoozed') ORDER BY next_due", (h[0],)
+        ).fetchall()
+
+def op_read_dashboard(conn: sqlite3.Connection, rng: random.Random, shape: Dict[str, int]):
+    uid = user_id(rng.randrange(shape["users"]))
+    conn.execute("""
+        SELECT t.id, t.title, t.next_due, t.priority
+        FROM Tasks t JOIN Homes h ON h.id = t.home_id
+        WHERE h.user_id = ? AND t.status = 'active' AND t.next_due <= date('now', '+14 days')
+        ORDER BY t.next_due
+    """, (uid,)).fetchall()
+    conn.execute("""
+        SELECT a.type, a.severity, a.headline, a.expires_at
+        FROM Alerts a JOIN Homes h ON h.id = a.home_id
+        WHERE h.user_id = ? AND a.expires_at >= datetime('now')
+        ORDER BY a.onset DESC
+    """, (uid,)).fetchall()
+
+def op_insert_alert(conn: sqlite3.Connection, rng: random.Random, shape: Dict[str, int]):
+    hid = home_id(rng.randrange(shape["users"]), rng.randrange(shape["homes_per_user"]))
+    conn.execute("""
+        INSERT INTO Alerts (home_id, source, type, severity, headline, onset, expires_at)
+        VALUES (?, 'NWS', 'Heat Advisory', ?, 'Heat Advisory in effect', datetime('now'), datetime('now', '+1 day'))
+    """, (hid, rng.choice(SEVERITIES)))
+
+def op_complete_task(conn: sqlite3.Connection, rng: random.Random, shape: Dict[str, int]):
+    tid = task_id(rng.randrange(shape["users"]), rng.randrange(shape["homes_per_user"]), rng.randrange(shape["tasks_per_home"]))
+    conn.execute("INSERT INTO TaskCompletions (task_id, notes) VALUES (?, 'stress test')", (tid,))
+    conn.execute("""
+        UPDATE Tasks
+        SET last_completed_at = CURRENT_TIMESTAMP,
+            next_due = date('now', '+' || COALESCE(frequency_days, 365) || ' days')
+        WHERE id = ?
+    """, (tid,))
+
+def op_import_property(conn: sqlite3.Connection, rng: random.Random, shape: Dict[str, int]):
+    payload = shape["attom_payload"]
+    prop = json.loads(payload)["property"][0]
+    prop["address"]["oneLine"] = f"{rng.getrandbits(48):x} N Imported Ave, Chicago, IL 60657"
+    mapped = map_attom_property_to_home_fields(prop)
+    uid = user_id(rng.randrange(shape["users"]))
+    hid = f"i{rng.getrandbits(96):024x}"
+    conn.execute("""
+        INSERT INTO Homes (id, user_id, address_text, latitude, longitude, building_type, year_built, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (hid, uid, mapped["address_text"], mapped["latitude"], mapped["longitude"],
+          mapped["building_type"], mapped["year_built"], mapped["created_at"], mapped["created_at"]))
+    conn.execute("INSERT INTO RawProperties (home_id, source, raw_json) VALUES (?, 'attom', ?)", (hid, payload))
+
+OPERATIONS = {
+    "read_profile": op_read_profile,
+    "read_dashboard": op_read_dashboard,
+    "insert_alert": op_insert_alert,
+    "complete_task": op_complete_task,
+    "import_property": op_import_property,
+}
+
+def _is_busy(e: sqlite3.OperationalError) -> bool:
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+# ---------- Workers ----------
+def run_worker(db_path: str, busy_timeout_ms: int, mix: Dict[str, int], duration: float,
+               seed: int, shape: Dict[str, Any], start_barrier=None) -> Dict[str, Any]:
+    """
+    Run operations until the deadline on a private connection. Writes run in
+    BEGIN IMMEDIATE transactions so the time to acquire the write lock can be
+    measured separately. All workers wait at start_barrier once connected, so
+    pool startup is not part of the run. Returns raw latencies and the
+    worker's own run window (wall-clock start/end) for the parent to aggregate.
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path, timeout=busy_timeout_ms / 1000.0, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    ops = list(mix)
+    weights = [mix[o] for o in ops]
+
+    latencies: Dict[str, List[float]] = {o: [] for o in ops}
+    busy_errors: Dict[str, int] = {o: 0 for o in ops}
+    lock_waits: List[float] = []
+    if start_barrier is not None:
+        start_barrier.wait(START_BARRIER_TIMEOUT_S)
+    window_start = time.time()
+    deadline = time.perf_counter() + duration
+    try:
+        while time.perf_counter() < deadline:
+            op = rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                if op in WRITE_OPS:
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                    finally:
+                        # Recorded whether or not the lock was eventually granted
+                        lock_waits.append(time.perf_counter() - started)
+                    try:
+                        OPERATIONS[op](conn, rng, shape)
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                else:
+                    OPERATIONS[op](conn, rng, shape)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                busy_errors[op] += 1
+                continue
+            latencies[op].append(time.perf_counter() - started)
+    finally:
+        window_end = time.time()
+        conn.close()
+    return {
+        "latencies": latencies, "busy_errors": busy_errors, "lock_waits": lock_waits,
+        "window": (window_start, window_end),
+    }
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+def _run_pool(pool, barrier, db_path: Path, busy_timeout_ms: int, mix: Dict[str, int],
+              duration: float, shape: Dict[str, Any], workers: int) -> List[Dict[str, Any]]:
+    futures = [
+        pool.submit(run_worker, db_path.as_posix(), busy_timeout_ms, mix, duration, seed, shape, barrier)
+        for seed in range(workers)
+    ]
+    return [f.result() for f in futures]
+
+def run_config(base_db: Path, workdir: Path, journal_mode: str, busy_timeout_ms: int, executor: str,
+               workers: int, duration: float, mix: Dict[str, int], shape: Dict[str, Any]) -> Dict[str, Any]:
+    db_path = workdir / f"stress_{journal_mode}_{busy_timeout_ms}_{executor}.db"
+    shutil.copy(base_db, db_path)
+    conn = sqlite3.connect(db_path.as_posix())
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    conn.close()
+
+    started = time.time()
+    if executor == "thread":
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = _run_pool(pool, threading.Barrier(workers), db_path, busy_timeout_ms, mix, duration, shape, workers)
+    else:
+        with Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+            results = _run_pool(pool, manager.Barrier(workers), db_path, busy_timeout_ms, mix, duration, shape, workers)
+
+    # Throughput over the span the workers actually ran, not pool startup
+    window_start = min(r["window"][0] for r in results)
+    window_end = max(r["window"][1] for r in results)
+    elapsed = window_end - window_start
+
+    ops: Dict[str, Any] = {}
+    total_ok = 0
+    total_busy = 0
+    for op in mix:
+        lat = [x for r in results for x in r["latencies"][op]]
+        busy = sum(r["busy_errors"][op] for r in results)
+        total_ok += len(lat)
+        total_busy += busy
+        ops[op] = {
+            "count": len(lat),
+            "busy_errors": busy,
+            "p50_ms": _pct(lat, 50),
+            "p95_ms": _pct(lat, 95),
+            "p99_ms": _pct(lat, 99),
+        }
+    waits = [x for r in results for x in r["lock_waits"]]
+
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        Path(db_path.as_posix() + suffix).unlink(missing_ok=True)
+
+    return {
+        "journal_mode": journal_mode,
+        "busy_timeout_ms": busy_timeout_ms,
+        "executor": executor,
+        "workers": workers,
+        "startup_s": window_start - started,
+        "elapsed_s": elapsed,
+        "ops_per_s": total_ok / elapsed if elapsed else 0.0,
+        "busy_errors": total_busy,
+        "lock_wait_total_s": float(sum(waits)),
+        "lock_wait_p99_ms": _pct(waits, 99),
+        "ops": ops,
+    }
+
+def print_report(results: List[Dict[str, Any]]):
+    print(f"\n{'='*100}")
+    print("📈 Stress test results")
+    print(f"{'='*100}")
+    print(f"{'journal':<9}{'timeout':>8}{'pool':>9}{'startup s':>11}{'ops/s':>10}{'busy':>8}{'lock wait s':>13}{'wait p99 ms':>13}")
+    for r in results:
+        print(f"{r['journal_mode']:<9}{r['busy_timeout_ms']:>8}{r['executor']:>9}{r['startup_s']:>11.2f}{r['ops_per_s']:>10.0f}"
+              f"{r['busy_errors']:>8}{r['lock_wait_total_s']:>13.2f}{r['lock_wait_p99_ms']:>13.1f}")
+        for op, s in r["ops"].items():
+            print(f"    {op:<17}{s['count']:>8} ok {s['busy_errors']:>6} busy   "
+                  f"p50 {s['p50_ms']:>8.2f} ms  p95 {s['p95_ms']:>8.2f} ms  p99 {s['p99_ms']:>8.2f} ms")
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise ValueError(f"Unknown operation {name}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = int(weight)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description="Stress SQLite concurrency settings with a HouseKeep workload")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--homes-per-user", type=int, default=2)
+    parser.add_argument("--tasks-per-home", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per configuration")
+    parser.add_argument("--journal-modes", default="delete,wal")
+    parser.add_argument("--busy-timeouts", default="0,100,1000,5000", help="Comma-separated milliseconds")
+    parser.add_argument("--executors", default="thread,process")
+    parser.add_argument("--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()))
+    parser.add_argument("--workdir", default=None, help="Where to put the generated databases (default: temp dir)")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="housekeep_stress_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    base_db = workdir / "stress_base.db"
+
+    print(f"🏗️  Generating {args.users} users x {args.homes_per_user} homes x {args.tasks_per_home} tasks in {base_db}")
+    generate_database(base_db, args.users, args.homes_per_user, args.tasks_per_home)
+    shape = {
+        "users": args.users,
+        "homes_per_user": args.homes_per_user,
+        "tasks_per_home": args.tasks_per_home,
+        "attom_payload": ATTOM_SAMPLE_PATH.read_text(encoding="utf-8"),
+    }
+
+    results = []
+    for journal_mode in args.journal_modes.split(","):
+        for busy_timeout in (int(t) for t in args.busy_timeouts.split(",")):
+            for executor in args.executors.split(","):
+                print(f"⏱️  {journal_mode} / busy_timeout={busy_timeout}ms / {executor} pool ...")
+                results.append(run_config(base_db, workdir, journal_mode, busy_timeout, executor,
+                                          args.workers, args.duration, mix, shape))
+
+    print_report(results)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(results, indent=2))
+        print(f"\n📂 Saved results to {args.json_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# conftest.py
+"""
+Shared fixtures. The database modules import each other as flat modules
+(from db_props import ...), so the database/ directory goes on sys.path.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+DATABASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, DATABASE_DIR.as_posix())
+
+import db_props  # noqa: E402
+
+SCHEMA_SQL = (DATABASE_DIR / "database_schema.sql").read_text() + db_props.RAW_PROPERTIES_DDL
+
+@pytest.fixture
+def single_db(tmp_path, monkeypatch):
+    """Unsharded db_props pointed at a fresh database in tmp_path"""
+    db_path = tmp_path / "housekeep.db"
+    monkeypatch.setattr(db_props, "DB_PATH", db_path)
+    db_props.configure_shards(None)
+    conn = db_props.get_connection()
+    conn.executescript(SCHEMA_SQL)
+    conn.close()
+    return db_path
+
+@pytest.fixture
+def sharded_db(tmp_path):
+    """db_props routed over three fresh shard files; unsharded again afterwards"""
+    paths = [(tmp_path / f"shard{i}.db").as_posix() for i in range(3)]
+    db_props.configure_shards(paths)
+    db_props.shard_router().init_shards(SCHEMA_SQL)
+    yield db_props.shard_router()
+    db_props.configure_shards(None)
+
+def user_on_shard(router, shard: int, prefix: str = "user") -> str:
+    """A user_id the router places on the given shard"""
+    i = 0
+    while router.shard_index(f"{prefix}-{i}") != shard:
+        i += 1
+    return f"{prefix}-{i}"
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+
+import alert_history
+import db_props
+from alert_history import AlertHistoryWriter, alert_counts
+from conftest import SCHEMA_SQL
+from db_props import get_connection, insert_alert
+from sharding import rebalance
+
+pytest.importorskip("pyarrow")
+
+@pytest.fixture
+def writer(single_db, tmp_path, monkeypatch):
+    conn = get_connection()
+    conn.executescript("""
+        INSERT INTO Users (id, username, display_name, password_hash) VALUES ('u1', 'ada', 'Ada', 'x');
+        INSERT INTO Homes (id, user_id, address_text) VALUES ('h1', 'u1', '1 Main St, Chicago, IL 60657');
+    """)
+    conn.commit()
+    conn.close()
+    w = AlertHistoryWriter(tmp_path / "history", flush_rows=3, flush_seconds=3600)
+    monkeypatch.setattr(db_props, "alert_history", w)
+    yield w
+    w.flush()
+
+def _insert(n: int, severity: str = "Severe"):
+    for i in range(n):
+        insert_alert("h1", "NWS", "Heat", severity, f"Heat advisory {i}",
+                     "2024-07-0%d 12:00:00" % (i % 9 + 1), "2024-07-10 12:00:00")
+
+def _total(w):
+    df = alert_counts(w.root, by=["zip"])
+    return int(df["alerts"].sum()) if len(df) else 0
+
+def test_inserts_sync_once_flush_rows_are_pending(writer):
+    _insert(2)
+    assert _total(writer) == 0
+    _insert(1)
+    assert _total(writer) == 3
+    assert alert_counts(writer.root, by=["state", "zip"]).to_dict("records") == [
+        {"month": "2024-07", "state": "IL", "zip": "60657", "alerts": 3}
+    ]
+
+def test_pending_alerts_sync_after_flush_seconds(writer):
+    writer.flush_seconds = 0.05
+    _insert(1)
+    deadline = time.monotonic() + 5
+    while _total(writer) == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert _total(writer) == 1
+
+def test_missing_pyarrow_does_not_fail_inserts_and_catches_up(writer, monkeypatch, capsys):
+    def no_pyarrow():
+        raise ImportError("pyarrow is not installed")
+    require_pyarrow = alert_history._require_pyarrow
+    monkeypatch.setattr(alert_history, "_require_pyarrow", no_pyarrow)
+    _insert(7)
+    assert "Alert history not updated" in capsys.readouterr().err
+    assert writer.synced_count() == 0
+
+    monkeypatch.setattr(alert_history, "_require_pyarrow", require_pyarrow)
+    assert writer.sync_shard() == 7
+    assert _total(writer) == 7
+
+def test_resync_after_crash_does_not_duplicate(writer, monkeypatch):
+    writer.flush_rows = 1000
+    _insert(3)
+    writer.sync_shard()
+    _insert(2)
+
+    # Crash after a chunk's files are written but before the ledger records it
+    write_frame = writer.write_frame
+    def write_then_crash(*args, **kwargs):
+        write_frame(*args, **kwargs)
+        raise KeyboardInterrupt
+    monkeypatch.setattr(writer, "write_frame", write_then_crash)
+    with pytest.raises(KeyboardInterrupt):
+        writer.sync_shard()
+    assert _total(writer) == 5
+    monkeypatch.setattr(writer, "write_frame", write_frame)
+
+    assert writer.sync_shard() == 2
+    assert _total(writer) == 5
+    assert writer.synced_count() == 5
+
+def test_alert_after_delete_is_synced(writer):
+    # SQLite hands the deleted row's rowid to the next insert
+    writer.flush_rows = 1000
+    _insert(2)
+    writer.sync_shard()
+    conn = get_connection()
+    conn.execute("DELETE FROM Alerts WHERE rowid = (SELECT max(rowid) FROM Alerts)")
+    conn.commit()
+    conn.close()
+    insert_alert("h1", "NWS", "Flood", "Extreme", "Flood warning", "2024-07-05 12:00:00", "2024-07-06 12:00:00")
+
+    assert writer.sync_shard() == 1
+    assert _total(writer) == 3
+    assert writer.synced_count() == 3
+
+def test_rebalanced_alerts_are_not_synced_twice(tmp_path, monkeypatch):
+    old = [(tmp_path / "shard0.db").as_posix()]
+    new = old + [(tmp_path / "shard1.db").as_posix()]
+    db_props.configure_shards(old)
+    db_props.shard_router().init_shards(SCHEMA_SQL)
+    w = AlertHistoryWriter(tmp_path / "history", flush_rows=1000, flush_seconds=3600)
+    monkeypatch.setattr(db_props, "alert_history", w)
+    try:
+        conn = db_props.get_connection(shard=0)
+        for i in range(6):
+            conn.execute("INSERT INTO Users (id, username, display_name, password_hash) VALUES (?, ?, ?, 'x')",
+                         (f"u{i}", f"u{i}", f"u{i}"))
+            conn.execute("INSERT INTO Homes (id, user_id, address_text) VALUES (?, ?, '1 Main St, Chicago, IL 60657')",
+                         (f"h{i}", f"u{i}"))
+        conn.commit()
+        conn.close()
+        for i in range(6):
+            insert_alert(f"h{i}", "NWS", "Heat", "Severe", "Heat", "2024-07-01 12:00:00", "2024-07-02 12:00:00")
+        assert w.sync_shard(0) == 6
+
+        moved = rebalance(old, new, SCHEMA_SQL)
+        assert sum(moved.values()) > 0
+        db_props.configure_shards(new)
+        assert sum(w.sync_shard(shard, full=True) for shard in db_props.shard_indexes()) == 0
+        assert _total(w) == 6
+    finally:
+        db_props.configure_shards(None)
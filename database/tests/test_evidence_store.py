@@ -0,0 +1,100 @@
+import io
+import threading
+import time
+
+from conftest import user_on_shard
+from db_props import get_connection
+from evidence_store import EvidenceStore
+
+def _age_blob(user_id: str, key: str, seconds: int):
+    conn = get_connection(user_id=user_id)
+    conn.execute(
+        "UPDATE EvidenceBlobs SET last_put_at = datetime('now', ?) WHERE key = ?",
+        (f"-{seconds} seconds", key),
+    )
+    conn.commit()
+    conn.close()
+
+def _blob_row(user_id: str, key: str):
+    conn = get_connection(user_id=user_id)
+    row = conn.execute("SELECT refcount FROM EvidenceBlobs WHERE key = ?", (key,)).fetchone()
+    conn.close()
+    return row
+
+def test_put_deduplicates(single_db, tmp_path):
+    store = EvidenceStore(tmp_path / "evidence")
+    k1 = store.put(io.BytesIO(b"photo"))
+    k2 = store.put(io.BytesIO(b"photo"))
+    assert k1 == k2
+    assert store.read_range(k1, 1, 3) == b"ho"
+    assert len(list((tmp_path / "evidence" / "objects").rglob("*"))) == 3  # aa/, aa/bb/, digest
+
+def test_gc_removes_old_unreferenced_blob(single_db, tmp_path):
+    store = EvidenceStore(tmp_path / "evidence")
+    key = store.put(io.BytesIO(b"stale"))
+    conn = get_connection()
+    conn.execute("UPDATE EvidenceBlobs SET last_put_at = datetime('now', '-7200 seconds')")
+    conn.commit()
+    conn.close()
+
+    stats = store.collect_garbage(grace_seconds=3600)
+    assert stats["files_deleted"] == 1
+    assert not store.exists(key)
+
+def test_gc_keeps_blob_freshly_uploaded_on_another_shard(sharded_db, tmp_path):
+    store = EvidenceStore(tmp_path / "evidence")
+    user_a = user_on_shard(sharded_db, 0, "a")
+    user_b = user_on_shard(sharded_db, 2, "b")
+
+    # A's copy is old and unreferenced; B has just uploaded the same bytes
+    # and has not written the Task row pointing at it yet.
+    key = store.put(io.BytesIO(b"same photo"), user_id=user_a)
+    _age_blob(user_a, key, 7200)
+    assert store.put(io.BytesIO(b"same photo"), user_id=user_b) == key
+
+    stats = store.collect_garbage(grace_seconds=3600)
+    assert stats["rows_deleted"] == 1
+    assert stats["files_deleted"] == 0
+    assert store.exists(key)
+    assert _blob_row(user_a, key) is None
+    assert _blob_row(user_b, key) == (0,)
+
+def test_gc_keeps_blob_referenced_on_another_shard(sharded_db, tmp_path):
+    store = EvidenceStore(tmp_path / "evidence")
+    user_a = user_on_shard(sharded_db, 0, "a")
+    user_b = user_on_shard(sharded_db, 1, "b")
+
+    key = store.put(io.BytesIO(b"shared"), user_id=user_a)
+    store.put(io.BytesIO(b"shared"), user_id=user_b)
+    conn = get_connection(user_id=user_b)
+    conn.execute("UPDATE EvidenceBlobs SET refcount = 1 WHERE key = ?", (key,))
+    conn.commit()
+    conn.close()
+    _age_blob(user_a, key, 7200)
+    _age_blob(user_b, key, 7200)
+
+    store.collect_garbage(grace_seconds=3600)
+    assert store.exists(key)
+
+def test_gc_waits_for_put_racing_on_another_shard(sharded_db, tmp_path, monkeypatch):
+    store = EvidenceStore(tmp_path / "evidence")
+    user_a = user_on_shard(sharded_db, 0, "a")
+    user_b = user_on_shard(sharded_db, 2, "b")
+    key = store.put(io.BytesIO(b"racing photo"), user_id=user_a)
+    _age_blob(user_a, key, 7200)
+
+    # B uploads the same bytes after GC has checked the other shards but before it unlinks
+    uploader = threading.Thread(target=store.put, args=(io.BytesIO(b"racing photo"), user_b))
+    live_in_other_shards = store._live_in_other_shards
+    def check_then_race(*args):
+        live = live_in_other_shards(*args)
+        if uploader.ident is None:
+            uploader.start()
+            time.sleep(0.3)
+        return live
+    monkeypatch.setattr(store, "_live_in_other_shards", check_then_race)
+
+    store.collect_garbage(grace_seconds=3600)
+    uploader.join()
+    assert _blob_row(user_b, key) == (0,)
+    assert store.exists(key)
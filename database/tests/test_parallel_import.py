@@ -0,0 +1,66 @@
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from db_props import get_connection
+from parallel_import import ensure_import_tables, import_archive
+
+ATTOM_SAMPLE = Path(__file__).resolve().parents[2] / "TESTINGATTOM.json"
+
+@pytest.fixture
+def users(single_db):
+    conn = get_connection()
+    conn.executescript("""
+        INSERT INTO Users (id, username, display_name, password_hash) VALUES ('ua', 'a', 'A', 'x');
+        INSERT INTO Users (id, username, display_name, password_hash) VALUES ('ub', 'b', 'B', 'x');
+    """)
+    conn.commit()
+    conn.close()
+
+def _homes(user_id):
+    conn = get_connection()
+    n = conn.execute("SELECT COUNT(*) FROM Homes WHERE user_id = ?", (user_id,)).fetchone()[0]
+    conn.close()
+    return n
+
+def test_checkpoints_are_per_user(users):
+    paths = [ATTOM_SAMPLE.as_posix()]
+    first = import_archive("ua", paths, workers=1, progress=None)
+    again = import_archive("ua", paths, workers=1, progress=None)
+    other = import_archive("ub", paths, workers=1, progress=None)
+
+    assert (first["inserted"], again["skipped"]) == (1, 1)
+    assert (other["inserted"], other["skipped"]) == (1, 0)
+    assert _homes("ua") == _homes("ub") == 1
+    conn = get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM ImportCheckpoint WHERE path = ?", (paths[0],)).fetchone()[0] == 2
+    conn.close()
+
+def test_path_keyed_checkpoints_are_migrated(single_db):
+    conn = get_connection()
+    conn.executescript("""
+        CREATE TABLE ImportCheckpoint (
+            path TEXT PRIMARY KEY, user_id TEXT, home_id TEXT,
+            status TEXT NOT NULL, error TEXT, imported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO ImportCheckpoint (path, user_id, status) VALUES ('a.json', 'ua', 'done');
+    """)
+    ensure_import_tables(conn)
+    pk = [r[1] for r in conn.execute("PRAGMA table_info(ImportCheckpoint)") if r[5]]
+    assert sorted(pk) == ["path", "user_id"]
+    assert conn.execute("SELECT user_id, path, status FROM ImportCheckpoint").fetchall() == [("ua", "a.json", "done")]
+    conn.close()
+
+def test_profile_cache_cleared_when_import_fails(users, monkeypatch):
+    import parallel_import
+
+    cleared = []
+    monkeypatch.setattr(parallel_import.profile_cache, "clear", lambda: cleared.append(True))
+    def fail(*args):
+        raise sqlite3.OperationalError("disk I/O error")
+    monkeypatch.setattr(parallel_import, "_write_batch", fail)
+
+    with pytest.raises(sqlite3.OperationalError):
+        import_archive("ua", [ATTOM_SAMPLE.as_posix()], workers=1, progress=None)
+    assert cleared == [True]
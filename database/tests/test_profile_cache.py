@@ -0,0 +1,56 @@
+from profile_cache import ProfileCache
+
+def test_lru_evicts_least_recently_used():
+    cache = ProfileCache(max_size=2)
+    cache.get_or_load("a", lambda: {"v": 1})
+    cache.get_or_load("b", lambda: {"v": 2})
+    cache.get("a")
+    cache.get_or_load("c", lambda: {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+    assert cache.stats()["evictions"] == 1
+
+def test_callers_get_independent_copies():
+    cache = ProfileCache()
+    first = cache.get_or_load(("user", "u1"), lambda: {"homes": [{"id": "h1"}]})
+    first["homes"].append({"id": "mutated"})
+    second = cache.get_or_load(("user", "u1"), lambda: None)
+    second["homes"][0]["id"] = "mutated too"
+    assert cache.get(("user", "u1")) == {"homes": [{"id": "h1"}]}
+
+def test_invalidation_during_load_is_not_cached():
+    cache = ProfileCache()
+    key = ("user", "u1")
+
+    def load():
+        cache.invalidate(key)
+        return {"stale": True}
+
+    assert cache.get_or_load(key, load) == {"stale": True}
+    assert cache.get(key) is None
+    assert cache.get_or_load(key, lambda: {"stale": False}) == {"stale": False}
+
+def test_bookkeeping_stays_bounded():
+    cache = ProfileCache(max_size=2)
+    for i in range(10000):
+        user = f"u{i}"
+        cache.get_or_load(("user", user), lambda: {"user": user})
+        cache.remember_home_owner(f"h{i}", user)
+        cache.invalidate(("home", f"h{i}"))
+        cache.invalidate(("user", f"gone{i}"))
+    assert len(cache._versions) == 0
+    assert len(cache._loading) == 0
+    assert len(cache._home_owner) <= 2
+    assert len(cache._owned_homes) <= 2
+
+def test_home_write_invalidates_cached_owner():
+    cache = ProfileCache()
+
+    def load_user():
+        cache.remember_home_owner("h1", "u1")
+        return {"homes": ["h1"]}
+
+    cache.get_or_load(("user", "u1"), load_user)
+    cache.invalidate_home("h1")
+    assert cache.get(("user", "u1")) is None
+    assert cache._home_owner == {}
@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from db_props import get_connection
+from reminders import RateLimiter, StubCalendarSink, StubSmsSink, dispatch_reminders, ensure_reminder_log
+
+TODAY = date.today().isoformat()
+
+@pytest.fixture
+def due_tasks(single_db):
+    conn = get_connection()
+    conn.executescript(f"""
+        INSERT INTO Users (id, username, display_name, phone_e164, email, password_hash)
+        VALUES ('u1', 'ada', 'Ada', '+15555550100', 'ada@example.com', 'x');
+        INSERT INTO Homes (id, user_id, address_text) VALUES ('h1', 'u1', '1 Main St, Chicago, IL 60657');
+        INSERT INTO Tasks (id, home_id, title, category, frequency_days, next_due, remind_channel)
+        VALUES ('t1', 'h1', 'Test smoke alarms', 'Safety', 30, '{TODAY}', 'calendar'),
+               ('t2', 'h1', 'Replace HVAC filter', 'General', 90, '{TODAY}', 'calendar'),
+               ('t3', 'h1', 'Flush water heater', 'General', 365, '{TODAY}', 'sms');
+    """)
+    conn.commit()
+    conn.close()
+
+def _log_statuses():
+    conn = get_connection()
+    rows = dict(conn.execute("SELECT task_id, status FROM ReminderLog").fetchall())
+    conn.close()
+    return rows
+
+def test_stub_sinks_write_outbox_and_log_sent(due_tasks, tmp_path):
+    calendar = StubCalendarSink(outbox_path=tmp_path / "calendar.jsonl")
+    sms = StubSmsSink(outbox_path=tmp_path / "sms.jsonl")
+
+    summary = dispatch_reminders([calendar, sms], start=TODAY, end=TODAY)
+
+    assert summary["sent"] == 3 and summary["failed"] == 0
+    assert _log_statuses() == {"t1": "sent", "t2": "sent", "t3": "sent"}
+    assert [m["recipient"] for m in calendar.sent] == ["ada@example.com"]
+    assert {e["date"] for e in calendar.sent[0]["body"]} == {TODAY}
+    outbox = [json.loads(line) for line in (tmp_path / "calendar.jsonl").read_text().splitlines()]
+    assert outbox == calendar.sent
+    assert sms.sent[0]["recipient"] == "+15555550100"
+    assert f"(due {TODAY})" in sms.sent[0]["body"]
+
+def test_second_run_sends_nothing(due_tasks):
+    calendar, sms = StubCalendarSink(), StubSmsSink()
+    dispatch_reminders([calendar, sms], start=TODAY, end=TODAY)
+    summary = dispatch_reminders([calendar, sms], start=TODAY, end=TODAY)
+    assert summary["selected"] == 0
+    assert len(calendar.sent) == 1 and len(sms.sent) == 1
+
+def test_failed_delivery_is_not_recorded_as_sent(due_tasks, tmp_path):
+    # A directory as outbox makes every write fail
+    calendar = StubCalendarSink(outbox_path=tmp_path)
+
+    summary = dispatch_reminders([calendar], start=TODAY, end=TODAY, max_retries=1, backoff_seconds=0)
+
+    assert summary["failed"] == 2
+    assert calendar.sent == []
+    assert _log_statuses() == {"t1": "failed", "t2": "failed"}
+
+def _strand_pending(task_id: str, seconds_ago: int):
+    """Simulate a run that claimed a reminder and crashed before sending it"""
+    conn = get_connection()
+    ensure_reminder_log(conn)
+    conn.execute("""
+        INSERT INTO ReminderLog (idempotency_key, task_id, channel, recipient, due_date, status, updated_at)
+        SELECT id || ':' || next_due || ':' || remind_channel, id, remind_channel, 'ada@example.com',
+               next_due, 'pending', datetime('now', ?)
+        FROM Tasks WHERE id = ?
+    """, (f"-{seconds_ago} seconds", task_id))
+    conn.commit()
+    conn.close()
+
+def test_recent_pending_claim_is_left_alone(due_tasks):
+    _strand_pending("t1", 60)
+    calendar = StubCalendarSink()
+    dispatch_reminders([calendar], start=TODAY, end=TODAY, pending_timeout_seconds=3600)
+    assert [e["summary"] for e in calendar.sent[0]["body"]] == ["Replace HVAC filter"]
+    assert _log_statuses()["t1"] == "pending"
+
+def test_stale_pending_claim_is_retried(due_tasks):
+    _strand_pending("t1", 7200)
+    calendar = StubCalendarSink()
+    summary = dispatch_reminders([calendar], start=TODAY, end=TODAY, pending_timeout_seconds=3600)
+    assert summary["sent"] == 2
+    assert _log_statuses() == {"t1": "sent", "t2": "sent"}
+
+def test_rate_limiter_below_one_per_second():
+    limiter = RateLimiter(0.5)
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started < 0.1
+    limiter.tokens = 0.9
+    limiter.updated = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started < 1.0
+
+def test_no_write_lock_held_while_sending(due_tasks):
+    conn = get_connection()
+    conn.executescript(f"""
+        INSERT INTO Users (id, username, display_name, email, password_hash)
+        VALUES ('u2', 'bo', 'Bo', 'bo@example.com', 'x');
+        INSERT INTO Homes (id, user_id, address_text) VALUES ('h2', 'u2', '2 Main St, Chicago, IL 60657');
+        INSERT INTO Tasks (id, home_id, title, category, frequency_days, next_due, remind_channel)
+        VALUES ('t4', 'h2', 'Clean gutters', 'Seasonal', 180, '{TODAY}', 'calendar');
+    """)
+    ensure_reminder_log(conn)
+    conn.commit()
+    conn.close()
+
+    release = threading.Event()
+
+    class SlowForBo(StubCalendarSink):
+        def send(self, recipient, reminders):
+            if recipient == "bo@example.com":
+                release.wait(10)
+            super().send(recipient, reminders)
+
+    calendar = SlowForBo()
+    runner = threading.Thread(target=dispatch_reminders, args=([calendar],),
+                              kwargs={"start": TODAY, "end": TODAY, "max_workers": 2})
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while _log_statuses().get("t1") != "sent" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert _log_statuses().get("t1") == "sent"
+
+        # Ada's batch is recorded while Bo's send is still in flight: other writers must get through
+        other = sqlite3.connect(get_connection().execute("PRAGMA database_list").fetchone()[2], timeout=0.2)
+        other.execute("INSERT INTO Users (id, username, display_name, password_hash) VALUES ('u3', 'cy', 'Cy', 'x')")
+        other.commit()
+        other.close()
+    finally:
+        release.set()
+        runner.join()
+    assert _log_statuses()["t4"] == "sent"
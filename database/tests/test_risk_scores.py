@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from db_props import get_connection
+from risk_scores import compute_risk_scores, load_signatures, refresh_risk_scores
+
+NOW = datetime(2025, 1, 5, 18, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def homes(single_db):
+    conn = get_connection()
+    conn.executescript("""
+        INSERT INTO Users (id, username, display_name, password_hash) VALUES ('u1', 'ada', 'Ada', 'x');
+        INSERT INTO Homes (id, user_id, address_text, building_type, year_built, has_central_ac) VALUES
+            ('h0', 'u1', '0 Elm St', 'house', 1930, 0),
+            ('h1', 'u1', '1 Elm St', 'condo', 2015, 1),
+            ('h2', 'u1', '2 Elm St', 'townhome', 1990, 1);
+        INSERT INTO RawProperties (home_id, source, raw_json) VALUES
+            ('h0', 'attom', '{"property": [{"lot": {"lotsize2": 8000, "pooltype": "POOL"}}]}'),
+            ('h1', 'attom', '{"property": [{"building": {"summary": {"levels": 2}}}]}'),
+            ('h2', 'attom', '{"property": [{}]}');
+    """)
+    conn.commit()
+    conn.close()
+
+def _add_alert(home_id, severity, onset, expires_at):
+    conn = get_connection()
+    conn.execute("""
+        INSERT INTO Alerts (home_id, source, type, severity, headline, onset, expires_at)
+        VALUES (?, 'NWS', 'Winter Storm Warning', ?, 'Storm', ?, ?)
+    """, (home_id, severity, onset, expires_at))
+    conn.commit()
+    conn.close()
+
+def _scores():
+    conn = get_connection()
+    scores = dict(conn.execute("SELECT home_id, score FROM HomeRiskScores").fetchall())
+    conn.close()
+    return scores
+
+def test_compute_risk_scores_ranks_riskier_home_higher():
+    features = pd.DataFrame({
+        "year_built": [1920, 2020],
+        "building_type": ["house", "apartment"],
+        "has_central_ac": [0, 1],
+        "max_severity": [4, 0],
+        "overdue_tasks": [7, 0],
+        "lot_sqft": [43560, None],
+        "pooltype": ["POOL", None],
+        "levels": [4, None],
+    })
+    old, new = compute_risk_scores(features, NOW)
+    assert old == 96.0  # everything saturated; a house carries 0.6 of the building weight
+    assert 0 < new < 20
+
+def test_refresh_only_rescores_changed_homes(homes):
+    assert refresh_risk_scores(now=NOW) == 3
+    assert refresh_risk_scores(now=NOW) == 0
+
+    # NULL year_built and no RawProperties row must not change the other homes' hashes
+    conn = get_connection()
+    conn.execute("INSERT INTO Homes (id, user_id, address_text) VALUES ('h3', 'u1', '3 Elm St')")
+    conn.commit()
+    conn.close()
+    assert refresh_risk_scores(now=NOW) == 1
+    assert set(_scores()) == {"h0", "h1", "h2", "h3"}
+
+def test_scores_age_with_the_year(homes):
+    refresh_risk_scores(now=NOW)
+    before = _scores()
+    assert refresh_risk_scores(now=NOW.replace(year=2026)) == 3
+    assert _scores()["h2"] > before["h2"]
+
+def test_iso_alert_with_offset_is_active(homes):
+    refresh_risk_scores(now=NOW)
+    before = _scores()
+
+    # Started earlier today, in NWS format with a UTC offset
+    onset = (NOW - timedelta(hours=2)).astimezone(timezone(timedelta(hours=-6))).isoformat()
+    expires = (NOW + timedelta(hours=6)).astimezone(timezone(timedelta(hours=-6))).isoformat()
+    _add_alert("h0", "Extreme", onset, expires)
+    # Expired an hour ago in local time, though the naive string would compare as still running
+    _add_alert("h1", "Severe", "2025-01-05T08:00:00-06:00", "2025-01-05T11:00:00-06:00")
+
+    assert refresh_risk_scores(now=NOW) == 1
+    assert _scores()["h0"] == pytest.approx(before["h0"] + 30.0)
+
+    conn = get_connection()
+    signatures = load_signatures(conn, NOW).set_index("home_id")
+    conn.close()
+    assert signatures.loc["h0", "max_severity"] == 4
+    assert signatures.loc["h1", "active_alerts"] == 0
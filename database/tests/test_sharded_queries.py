@@ -0,0 +1,106 @@
+import csv
+import sys
+
+import pytest
+
+from conftest import user_on_shard
+from database import HouseKeepDB, needs_merge
+import export
+from db_props import get_home_profile
+from profile_cache import profile_cache
+
+@pytest.fixture
+def homes(sharded_db):
+    """Two homes on each of the three shards"""
+    for shard in range(sharded_db.shard_count):
+        user_id = user_on_shard(sharded_db, shard)
+        conn = sharded_db.connect(shard)
+        conn.execute("INSERT INTO Users (id, username, display_name, password_hash) VALUES (?, ?, ?, 'x')",
+                     (user_id, user_id, user_id))
+        conn.executemany("INSERT INTO Homes (id, user_id, address_text, year_built) VALUES (?, ?, ?, ?)", [
+            (f"h{shard}a", user_id, f"{shard} A St", 1950 + shard),
+            (f"h{shard}b", user_id, f"{shard} B St", 2000 + shard),
+        ])
+        conn.commit()
+        conn.close()
+    return sharded_db
+
+def test_needs_merge():
+    assert needs_merge("SELECT COUNT(*) FROM Homes")
+    assert needs_merge("select * from Homes order by year_built limit 2")
+    assert not needs_merge("SELECT * FROM Homes WHERE address_text = 'Count St'")
+
+def test_plain_fan_out_concatenates(homes):
+    db = HouseKeepDB(shard_paths=[p.as_posix() for p in homes.paths])
+    assert len(db.execute_query("SELECT id FROM Homes")) == 6
+
+def test_aggregates_and_limits_require_merge(homes):
+    db = HouseKeepDB(shard_paths=[p.as_posix() for p in homes.paths])
+    with pytest.raises(ValueError):
+        db.execute_query("SELECT COUNT(*) AS n FROM Homes")
+    with pytest.raises(ValueError):
+        db.execute_query("SELECT id FROM Homes ORDER BY year_built LIMIT 2")
+
+    total = db.execute_query("SELECT COUNT(*) AS n FROM Homes", merge=lambda rows: [{"n": sum(r["n"] for r in rows)}])
+    assert total == [{"n": 6}]
+    oldest = db.execute_query(
+        "SELECT id, year_built FROM Homes ORDER BY year_built LIMIT 2",
+        merge=lambda rows: sorted(rows, key=lambda r: r["year_built"])[:2],
+    )
+    assert [r["id"] for r in oldest] == ["h0a", "h1a"]
+
+def test_single_user_query_needs_no_merge(homes):
+    db = HouseKeepDB(shard_paths=[p.as_posix() for p in homes.paths])
+    user_id = user_on_shard(homes, 1)
+    rows = db.execute_query("SELECT COUNT(*) AS n FROM Homes WHERE user_id = ?", (user_id,), user_id=user_id)
+    assert rows == [{"n": 2}]
+
+def test_export_reads_every_shard(homes, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["export.py", "Homes", "--out", str(tmp_path), "--partition-by-home"])
+    export.main()
+    files = sorted(p.parent.name for p in tmp_path.glob("home_id=*/Homes.csv"))
+    assert files == [f"home_id=h{s}{x}" for s in range(3) for x in "ab"]
+
+    db = HouseKeepDB(shard_paths=[p.as_posix() for p in homes.paths])
+    result = export.export_table(db.connect_all(), "Homes", tmp_path / "flat", columns=["id"])
+    db.disconnect()
+    with open(result["files"][0], newline="") as f:
+        assert len(list(csv.DictReader(f))) == result["rows"] == 6
+
+def test_sharded_parquet_export_of_tasks(homes, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    for shard in range(homes.shard_count):
+        conn = homes.connect(shard)
+        conn.execute("""
+            INSERT INTO Tasks (home_id, title, category, frequency_days, next_due, last_completed_at)
+            VALUES (?, 'Test smoke alarms', 'Safety', 30, '2025-01-0' || ?, '2024-12-01 09:30:00')
+        """, (f"h{shard}a", shard + 1))
+        conn.commit()
+        conn.close()
+
+    db = HouseKeepDB(shard_paths=[p.as_posix() for p in homes.paths])
+    result = export.export_table(db.connect_all(), "Tasks", tmp_path, fmt="parquet")
+    db.disconnect()
+
+    table = pq.read_table(result["files"][0])
+    assert result["rows"] == table.num_rows == 3
+    assert sorted(table.column("next_due").to_pylist()) == ["2025-01-01", "2025-01-02", "2025-01-03"]
+
+def test_home_shard_cache_is_bounded(homes):
+    homes.home_cache_size = 2
+    for home_id in ("h0a", "h1a", "h2a", "h0b"):
+        assert homes.locate_home(home_id) == int(home_id[1])
+    assert list(homes._home_shards) == ["h2a", "h0b"]
+    assert homes.locate_home("missing") is None
+    assert "missing" not in homes._home_shards
+
+def test_deleted_home_is_forgotten(homes):
+    assert get_home_profile("h1b")["home"]["id"] == "h1b"
+    conn = homes.connect(1)
+    conn.execute("DELETE FROM Homes WHERE id = 'h1b'")
+    conn.commit()
+    conn.close()
+    profile_cache.invalidate_home("h1b")
+
+    assert get_home_profile("h1b") is None
+    assert "h1b" not in homes._home_shards